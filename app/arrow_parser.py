@@ -0,0 +1,87 @@
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # optional, only needed for IMPORT_PARSER=arrow
+    pa = None
+
+# Bytes of CSV parsed per block; each block becomes one normalized batch
+ARROW_BLOCK_SIZE = int(os.getenv("ARROW_BLOCK_SIZE", str(4 * 1024 * 1024)))
+
+COLUMNS = ["sku", "name", "description"]
+
+def arrow_available():
+    return pa is not None
+
+def _normalize(batch):
+    """Strips, drops rows without sku/name, and dedupes a record batch on
+    lower(sku) keeping the last row, all as column operations. Returns
+    (products table in file order, their lowercased SKUs, valid row count)."""
+    sku = pc.utf8_trim_whitespace(batch.column("sku"))
+    name = pc.utf8_trim_whitespace(batch.column("name"))
+    description = pc.utf8_trim_whitespace(pc.fill_null(batch.column("description"), ""))
+    
+    valid = pc.and_(pc.not_equal(sku, ""), pc.not_equal(name, ""))
+    table = pa.table({
+        "sku": pc.filter(sku, valid),
+        "name": pc.filter(name, valid),
+        "description": pc.filter(description, valid),
+    })
+    table = table.append_column("key", pc.utf8_lower(table.column("sku")))
+    table = table.append_column("row", pa.array(range(table.num_rows), pa.int64()))
+    
+    last_rows = table.group_by("key", use_threads=False).aggregate([("row", "max")]).column("row_max")
+    table = table.take(pc.take(last_rows, pc.sort_indices(last_rows)))
+    
+    description = table.column("description")
+    products = pa.table({
+        "sku": table.column("sku"),
+        "name": table.column("name"),
+        "description": pc.if_else(pc.equal(description, ""), pa.scalar(None, pa.string()), description),
+        "active": pa.repeat(True, table.num_rows),
+    })
+    return products, table.column("key"), int(pc.sum(valid).as_py() or 0)
+
+def iter_normalized_batches(f, skip_records: int = 0, block_size: int = ARROW_BLOCK_SIZE):
+    """Reads a binary CSV stream in blocks with pyarrow's streaming reader.
+    
+    Yields (records, valid_rows, products, keys) per block: records is the
+    number of data records read (valid or not), valid_rows how many had a
+    sku and name, products the ready-to-load dicts (deduped last-wins within
+    the block, in file order) and keys their lowercased SKUs. The first
+    skip_records records are parsed but not returned, for resuming.
+    """
+    if pa is None:
+        raise RuntimeError("IMPORT_PARSER=arrow requires the pyarrow package")
+    
+    reader = pa_csv.open_csv(
+        f,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={column: pa.string() for column in COLUMNS},
+            include_columns=COLUMNS,
+            include_missing_columns=True,
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+    
+    checked = False
+    for batch in reader:
+        # Present columns never parse to null, so an all-null column is missing
+        if not checked and batch.num_rows:
+            if batch.column("sku").null_count == batch.num_rows or batch.column("name").null_count == batch.num_rows:
+                raise ValueError("CSV must contain 'sku' and 'name' columns")
+            checked = True
+        
+        if skip_records:
+            skipped = min(skip_records, batch.num_rows)
+            skip_records -= skipped
+            batch = batch.slice(skipped)
+            if not batch.num_rows:
+                continue
+        
+        products, keys, valid_rows = _normalize(batch)
+        yield batch.num_rows, valid_rows, products.to_pylist(), keys.to_pylist()
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+import redis
+
+from app.celery_app import REDIS_URL
+from app.models import Webhook
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.from_url(REDIS_URL)
+
+PRODUCTS_GENERATION_KEY = "products:generation"
+COUNT_CACHE_TTL = int(os.getenv("COUNT_CACHE_TTL", "300"))
+PRODUCT_CACHE_TTL = int(os.getenv("PRODUCT_CACHE_TTL", "60"))
+WEBHOOK_CACHE_TTL = int(os.getenv("WEBHOOK_CACHE_TTL", "300"))
+CACHE_STATS_KEY = "cache:stats"
+CACHE_STATS_FLUSH_INTERVAL = 5.0
+
+class _CacheMetrics:
+    """Hit/miss counters kept in-process and added to the shared
+    cache:stats hash at most every CACHE_STATS_FLUSH_INTERVAL seconds, so
+    recording a lookup doesn't cost an extra Redis round trip."""
+    
+    def __init__(self):
+        self.counts = Counter()
+        self.last_flush = time.monotonic()
+    
+    def record(self, cache_name, hit):
+        self.counts[f"{cache_name}:{'hit' if hit else 'miss'}"] += 1
+        if time.monotonic() - self.last_flush >= CACHE_STATS_FLUSH_INTERVAL:
+            self.flush()
+    
+    def flush(self):
+        counts, self.counts = self.counts, Counter()
+        self.last_flush = time.monotonic()
+        if not counts:
+            return
+        
+        try:
+            pipe = redis_client.pipeline()
+            for field, value in counts.items():
+                pipe.hincrby(CACHE_STATS_KEY, field, value)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Failed to record cache stats: {e}")
+
+metrics = _CacheMetrics()
+
+def cache_stats():
+    metrics.flush()
+    raw = {k.decode(): int(v) for k, v in redis_client.hgetall(CACHE_STATS_KEY).items()}
+    
+    stats = {}
+    for cache_name in ("product", "webhooks"):
+        hits = raw.get(f"{cache_name}:hit", 0)
+        misses = raw.get(f"{cache_name}:miss", 0)
+        stats[cache_name] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return stats
+
+def products_generation():
+    value = redis_client.get(PRODUCTS_GENERATION_KEY)
+    return int(value) if value else 0
+
+def bump_products_generation():
+    """Invalidates every cached product count. Call after the write commits."""
+    try:
+        redis_client.incr(PRODUCTS_GENERATION_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to bump products generation: {e}")
+
+def count_cache_key(filters, generation):
+    """Keyed on the exact filter values the count query runs with, so callers
+    must clean them first (see _clean_product_filters in main)."""
+    digest = hashlib.sha1(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+    return f"products:count:{generation}:{digest}"
+
+def lookup_count(filters):
+    """(key, total) for this filter set under the current products
+    generation: the cached total, or None and the key to store_count the
+    computed total under (key is None too when Redis is unavailable). The
+    generation is read before counting, so a count that races a write is
+    stored under the generation that write retires."""
+    try:
+        key = count_cache_key(filters, products_generation())
+        cached = redis_client.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Count cache unavailable: {e}")
+        return None, None
+    
+    if cached is not None:
+        return None, int(cached)
+    return key, None
+
+def store_count(key, total):
+    try:
+        redis_client.setex(key, COUNT_CACHE_TTL, total)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to cache product count: {e}")
+
+def _product_key(product_id):
+    return f"cache:product:{product_id}"
+
+def get_cached_product(product_id):
+    try:
+        raw = redis_client.get(_product_key(product_id))
+    except redis.RedisError as e:
+        logger.warning(f"Product cache unavailable: {e}")
+        return None
+    
+    metrics.record("product", raw is not None)
+    return json.loads(raw) if raw is not None else None
+
+def cache_product(product_id, data):
+    try:
+        redis_client.setex(_product_key(product_id), PRODUCT_CACHE_TTL, json.dumps(data))
+    except redis.RedisError as e:
+        logger.warning(f"Failed to cache product {product_id}: {e}")
+
+def invalidate_products(product_ids):
+    product_ids = list(product_ids)
+    try:
+        for i in range(0, len(product_ids), 1000):
+            redis_client.delete(*[_product_key(pid) for pid in product_ids[i:i + 1000]])
+    except redis.RedisError as e:
+        logger.warning(f"Failed to invalidate cached products: {e}")
+
+def _delete_matching(pattern):
+    try:
+        keys = []
+        for key in redis_client.scan_iter(match=pattern, count=1000):
+            keys.append(key)
+            if len(keys) >= 1000:
+                redis_client.delete(*keys)
+                keys = []
+        if keys:
+            redis_client.delete(*keys)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to invalidate {pattern}: {e}")
+
+def invalidate_all_products():
+    _delete_matching("cache:product:*")
+
+def _subscriptions_key(event_type):
+    return f"cache:webhooks:{event_type}"
+
+def get_webhook_subscriptions(db, event_types):
+    """Enabled webhooks for each event type as {event_type: [{"id", "url"}]},
+    read through a Redis cache that the webhook endpoints invalidate.
+    Event types without subscribers are left out."""
+    subscriptions, missing = read_cached_subscriptions(event_types)
+    if missing:
+        subscriptions.update(query_subscriptions(db, missing))
+        cache_subscriptions(subscriptions, missing)
+    return {event_type: subs for event_type, subs in subscriptions.items() if subs}
+
+def read_cached_subscriptions(event_types):
+    """The Redis half of get_webhook_subscriptions: (subscriptions, missing),
+    where missing lists the event types that were not cached."""
+    event_types = sorted(set(event_types))
+    if not event_types:
+        return {}, []
+    
+    try:
+        cached = redis_client.mget([_subscriptions_key(t) for t in event_types])
+    except redis.RedisError as e:
+        logger.warning(f"Webhook cache unavailable: {e}")
+        cached = [None] * len(event_types)
+    
+    subscriptions = {}
+    missing = []
+    for event_type, raw in zip(event_types, cached):
+        metrics.record("webhooks", raw is not None)
+        if raw is not None:
+            subscriptions[event_type] = json.loads(raw)
+        else:
+            missing.append(event_type)
+    
+    return subscriptions, missing
+
+def query_subscriptions(db, event_types):
+    subscriptions = {event_type: [] for event_type in event_types}
+    webhooks = db.query(Webhook).filter(
+        Webhook.enabled == True,
+        Webhook.event_type.in_(event_types)
+    ).order_by(Webhook.id).all()
+    for webhook in webhooks:
+        subscriptions[webhook.event_type].append({"id": webhook.id, "url": webhook.url})
+    return subscriptions
+
+def cache_subscriptions(subscriptions, event_types):
+    try:
+        pipe = redis_client.pipeline()
+        for event_type in event_types:
+            pipe.setex(_subscriptions_key(event_type), WEBHOOK_CACHE_TTL, json.dumps(subscriptions[event_type]))
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Failed to cache webhook subscriptions: {e}")
+
+def invalidate_webhook_subscriptions():
+    _delete_matching("cache:webhooks:*")
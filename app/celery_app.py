@@ -33,5 +33,17 @@ celery_app.conf.update(
     enable_utc=True,
     task_track_started=True,
     task_acks_late=True,
+    # Requeue instead of failing tasks whose worker process died (OOM, max-memory-per-child),
+    # so imports resume from their checkpoint
+    task_reject_on_worker_lost=True,
     worker_prefetch_multiplier=1,
+    # Safety net for outbox events whose relay was never scheduled (web process
+    # died after committing, Redis or the broker was down); needs a beat process
+    # (celery worker -B or celery beat)
+    beat_schedule={
+        "relay-outbox-events": {
+            "task": "app.tasks.relay_outbox_events",
+            "schedule": float(os.getenv("OUTBOX_RELAY_INTERVAL", "30")),
+        },
+    },
 )
@@ -0,0 +1,41 @@
+import gzip
+import io
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for .csv.zst uploads
+    zstandard = None
+
+UPLOAD_SUFFIXES = (".csv", ".csv.gz", ".csv.zst")
+
+def upload_suffix(filename: str):
+    """Returns the accepted suffix of an upload's filename, or None."""
+    name = filename.lower()
+    for suffix in UPLOAD_SUFFIXES:
+        if name.endswith(suffix):
+            return suffix
+    return None
+
+def zstd_available():
+    return zstandard is not None
+
+@contextmanager
+def open_upload(file_path: str):
+    """Opens a stored upload as a binary stream of CSV bytes, decompressing
+    .gz and .zst files on the fly.
+    
+    Yields (f, position) where position() reports how many bytes of the file
+    on disk have been consumed, for progress against its (compressed) size.
+    """
+    with open(file_path, 'rb') as raw:
+        if file_path.endswith(".gz"):
+            with gzip.GzipFile(fileobj=raw) as f:
+                yield f, raw.tell
+        elif file_path.endswith(".zst"):
+            if zstandard is None:
+                raise ValueError("Reading .csv.zst uploads requires the zstandard package")
+            with io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=False)) as f:
+                yield f, raw.tell
+        else:
+            yield raw, raw.tell
@@ -1,7 +1,8 @@
 
 import os
 import sys
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, make_url, text
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Detect if we're in a production environment (Railway, Render, Heroku, etc.)
@@ -85,6 +86,14 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# asyncpg URL for the /api/async request path, derived from DATABASE_URL by default
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or make_url(DATABASE_URL).set(
+    drivername="postgresql+asyncpg"
+).render_as_string(hide_password=False)
+
+_async_engine = None
+_AsyncSessionLocal = None
+
 def get_db():
     db = SessionLocal()
     try:
@@ -92,5 +101,64 @@ def get_db():
     finally:
         db.close()
 
+def get_async_engine():
+    """The asyncpg engine, created on first use so that asyncpg is only
+    needed by processes that serve the async routes."""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True, pool_size=10, max_overflow=20)
+        # Objects stay loaded after commit; lazy loads can't run outside a greenlet
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+async def get_async_db():
+    get_async_engine()
+    async with _AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_async_engine():
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _AsyncSessionLocal = None
+
 def init_db():
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    
     Base.metadata.create_all(bind=engine)
+    migrate_columns()
+    migrate_indexes()
+
+def migrate_columns(bind=None):
+    # Likewise for columns added to a model after its table was created (e.g.
+    # the outbox retry columns). Such columns must be nullable or have a
+    # server default so that existing rows can take them.
+    bind = bind or engine
+    inspector = inspect(bind)
+    
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=bind.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
+def migrate_indexes(bind=None):
+    # create_all skips tables that already exist, so indexes added to a model
+    # after its table was created (e.g. the trigram search indexes) are
+    # created here. Each check is a catalog lookup, so this is cheap to rerun.
+    # SQLite can't reflect expression indexes and is only used for tests.
+    bind = bind or engine
+    if bind.dialect.name != "postgresql":
+        return
+    
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
@@ -1,29 +1,66 @@
 import os
+import io
+import csv
 import uuid
 import json
+import zlib
+import datetime
 from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.requests import Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, literal_column, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from typing import List, Optional
 import asyncio
-import redis.asyncio as aioredis
 
-from app.database import get_db, init_db
+from app.database import get_db, get_async_db, dispose_async_engine, init_db
+from app.progress_hub import ProgressHub
+from app.upload_stream import upload_stream_key, read_csv_header, forward_upload
+from app.compression import upload_suffix, zstd_available
+from app.profiling import pyinstrument_available
+from app.cache import (
+    lookup_count,
+    store_count,
+    bump_products_generation,
+    get_cached_product,
+    cache_product,
+    invalidate_products,
+    read_cached_subscriptions,
+    query_subscriptions,
+    cache_subscriptions,
+    invalidate_webhook_subscriptions,
+    cache_stats,
+)
 from app.models import Product, Webhook
 from app.schemas import (
     Product as ProductSchema,
     ProductCreate,
     ProductUpdate,
+    ProductBatchUpsert,
+    ProductBatchResult,
+    ProductBulkUpdate,
+    ProductBulkUpdateResult,
     Webhook as WebhookSchema,
     WebhookCreate,
     WebhookUpdate,
     UploadResponse,
+    TaskResponse,
+)
+from app.tasks import (
+    import_csv_task,
+    import_stream_task,
+    bulk_delete_products_task,
+    add_outbox_events,
+    schedule_outbox_relay,
+    product_payload,
+    get_webhook_stats,
 )
-from app.tasks import import_csv_task, trigger_webhooks
 
 app = FastAPI(title="Product Importer API")
 
@@ -31,24 +68,59 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+
+progress_hub = ProgressHub(REDIS_URL)
 UPLOAD_DIR = "uploads"
+# Filtered planner estimates below this are replaced with an exact count
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv("COUNT_ESTIMATE_THRESHOLD", "10000"))
+# Rows fetched per server-side cursor round trip (and encoded per chunk) by /api/products/export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+# Limits of one batch call: products per POST /api/products/batch, ids per PATCH /api/products
+PRODUCT_BATCH_MAX = int(os.getenv("PRODUCT_BATCH_MAX", "1000"))
+PRODUCT_PATCH_MAX_IDS = int(os.getenv("PRODUCT_PATCH_MAX_IDS", "50000"))
+# Dialect INSERTs that support ON CONFLICT DO UPDATE ... RETURNING
+UPSERT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @app.on_event("startup")
 def startup_event():
     init_db()
 
+@app.on_event("startup")
+async def start_progress_hub():
+    await progress_hub.start()
+
+@app.on_event("shutdown")
+async def stop_progress_hub():
+    await progress_hub.stop()
+
+@app.on_event("shutdown")
+async def stop_async_engine():
+    await dispose_async_engine()
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+PROFILE_QUERY = Query(None, pattern="^(cprofile|pyinstrument)$", description="Capture a profile of the import")
+
+def _check_profile_mode(profile: Optional[str]):
+    if profile == "pyinstrument" and not pyinstrument_available():
+        raise HTTPException(status_code=400, detail="pyinstrument profiling is not available on this server")
+
 @app.post("/api/upload", response_model=UploadResponse)
-async def upload_csv(file: UploadFile = File(...)):
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="File must be a CSV")
+async def upload_csv(file: UploadFile = File(...), profile: Optional[str] = PROFILE_QUERY):
+    # Compressed uploads are stored as-is and decompressed by the worker while it parses
+    suffix = upload_suffix(file.filename)
+    if suffix is None:
+        raise HTTPException(status_code=400, detail="File must be a CSV (.csv, .csv.gz or .csv.zst)")
+    if suffix == ".csv.zst" and not zstd_available():
+        raise HTTPException(status_code=400, detail="zstd-compressed uploads are not supported on this server")
+    _check_profile_mode(profile)
     
     file_id = str(uuid.uuid4())
-    file_path = os.path.join(UPLOAD_DIR, f"{file_id}.csv")
+    file_path = os.path.join(UPLOAD_DIR, f"{file_id}{suffix}")
     
     CHUNK_SIZE = 1024 * 1024
     
@@ -57,54 +129,83 @@ async def upload_csv(file: UploadFile = File(...)):
             f.write(chunk)
     
     file_size = os.path.getsize(file_path)
-    task = import_csv_task.delay(file_path, file_size)
+    task = import_csv_task.delay(file_path, file_size, profile)
     
     return UploadResponse(
         task_id=task.id,
         message="File upload started. Processing in background."
     )
 
+@app.post("/api/upload/stream", response_model=UploadResponse)
+async def upload_csv_stream(request: Request, profile: Optional[str] = PROFILE_QUERY):
+    """Takes the CSV as the raw request body and forwards it to the worker
+    through a Redis stream as it arrives. The import task is queued as soon
+    as the header has been checked, so upserts start before the upload ends."""
+    _check_profile_mode(profile)
+    chunks = request.stream().__aiter__()
+    
+    try:
+        head = await read_csv_header(chunks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    stream_key = upload_stream_key(str(uuid.uuid4()))
+    file_size = int(request.headers.get("content-length") or 0)
+    task = import_stream_task.delay(stream_key, file_size, profile)
+    
+    await forward_upload(progress_hub.redis, stream_key, head, chunks)
+    
+    return UploadResponse(
+        task_id=task.id,
+        message="File upload streamed. Processing in background."
+    )
+
 @app.get("/api/progress/{task_id}")
 async def progress_stream(task_id: str):
+    # Subscribe before reading the cached status so no update falls in between
+    queue = progress_hub.subscribe(task_id)
+    
     async def event_generator():
-        redis_conn = await aioredis.from_url(REDIS_URL)
-        pubsub = redis_conn.pubsub()
-        await pubsub.subscribe(f"progress:{task_id}")
-        
-        cached_status = await redis_conn.get(f"task_status:{task_id}")
-        if cached_status:
-            yield f"data: {cached_status.decode()}\n\n"
-        
         try:
+            cached_status = await progress_hub.get_status(task_id)
+            if cached_status:
+                yield f"data: {cached_status}\n\n"
+                if json.loads(cached_status)['status'] in ['completed', 'failed']:
+                    return
+            
             while True:
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=30)
-                if message and message['type'] == 'message':
-                    data = message['data'].decode()
-                    yield f"data: {data}\n\n"
-                    
-                    parsed = json.loads(data)
-                    if parsed['status'] in ['completed', 'failed']:
-                        break
+                try:
+                    data = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
                 
-                await asyncio.sleep(0.1)
+                yield f"data: {data}\n\n"
+                
+                parsed = json.loads(data)
+                if parsed['status'] in ['completed', 'failed']:
+                    break
         finally:
-            await pubsub.unsubscribe(f"progress:{task_id}")
-            await redis_conn.close()
+            progress_hub.unsubscribe(task_id, queue)
     
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-@app.get("/api/products", response_model=dict)
-def list_products(
-    page: int = Query(1, ge=1),
-    per_page: int = Query(20, ge=1, le=100),
-    sku: Optional[str] = None,
-    name: Optional[str] = None,
-    active: Optional[bool] = None,
-    search: Optional[str] = None,
-    db: Session = Depends(get_db)
-):
-    query = db.query(Product)
-    
+def _clean_product_filters(filters):
+    """filters with string values stripped and blank or None ones dropped,
+    which _apply_product_filters would ignore anyway."""
+    cleaned = {}
+    for key, value in filters.items():
+        if isinstance(value, str):
+            value = value.strip()
+        if value is not None and value != "":
+            cleaned[key] = value
+    return cleaned
+
+def _apply_product_filters(query, sku=None, name=None, active=None, search=None):
     if sku:
         query = query.filter(func.lower(Product.sku).contains(sku.lower()))
     
@@ -124,20 +225,186 @@ def list_products(
             )
         )
     
-    total = query.count()
-    
-    products = query.order_by(Product.id.desc()).offset((page - 1) * per_page).limit(per_page).all()
+    return query
+
+def _estimated_product_count(db: Session, query=None):
+    """Planner row estimate, or None when unavailable (SQLite, a table that has
+    never been analyzed, or a filtered estimate too small to trust over an
+    exact count). Unfiltered listings read pg_class.reltuples; filtered ones
+    read the row estimate from EXPLAIN."""
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    
+    if query is None:
+        estimate = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'products'::regclass")
+        ).scalar()
+        return estimate if estimate is not None and estimate >= 0 else None
+    
+    compiled = query.statement.compile(dialect=db.get_bind().dialect)
+    params = compiled.params
+    if compiled.positional:
+        # asyncpg's $1, $2 placeholders take a tuple in positiontup order
+        params = tuple(params[name] for name in compiled.positiontup)
+    plan = db.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+    return estimate if estimate >= COUNT_ESTIMATE_THRESHOLD else None
+
+@app.get("/api/products", response_model=dict)
+def list_products(
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    sku: Optional[str] = None,
+    name: Optional[str] = None,
+    active: Optional[bool] = None,
+    search: Optional[str] = None,
+    after_id: Optional[int] = Query(None, ge=1),
+    before_id: Optional[int] = Query(None, ge=1),
+    count: str = Query("exact", pattern="^(exact|estimated|none)$"),
+    db: Session = Depends(get_db)
+):
+    """Lists products newest first.
+    
+    page/per_page use OFFSET. after_id or before_id (not both) switch to keyset
+    pagination, seeking on the primary key so deep pages cost the same as the
+    first one.
+    Exact totals are cached in Redis per filter set until the next product
+    write. count=estimated returns planner estimates for unfiltered or broad
+    listings and count=none skips the total entirely.
+    """
+    if after_id is not None and before_id is not None:
+        raise HTTPException(status_code=400, detail="Pass after_id or before_id, not both")
+    
+    filters = _clean_product_filters({"sku": sku, "name": name, "active": active, "search": search})
+    count_key, cached_total = lookup_count(filters) if count != "none" else (None, None)
+    page_data = _list_products(db, filters, page, per_page, after_id, before_id, count, cached_total)
+    if count_key is not None and not page_data["total_is_estimate"]:
+        store_count(count_key, page_data["total"])
+    return page_data
+
+def _list_products(db: Session, filters, page, per_page, after_id, before_id, count, cached_total=None):
+    """One page of products. cached_total is the exact total for filters
+    from lookup_count, if it was cached."""
+    query = _apply_product_filters(db.query(Product), **filters)
+    
+    total = None
+    if count == "estimated":
+        total = _estimated_product_count(db, query if filters else None)
+    total_is_estimate = total is not None
+    if total is None and count != "none":
+        total = cached_total if cached_total is not None else query.count()
+    
+    if after_id is not None or before_id is not None:
+        if after_id is not None:
+            keyset = query.filter(Product.id < after_id).order_by(Product.id.desc())
+        else:
+            keyset = query.filter(Product.id > before_id).order_by(Product.id.asc())
+        
+        products = keyset.limit(per_page + 1).all()
+        has_more = len(products) > per_page
+        products = products[:per_page]
+        if before_id is not None:
+            products.reverse()
+        
+        has_next = has_more if after_id is not None else True
+        has_prev = has_more if before_id is not None else True
+    else:
+        products = query.order_by(Product.id.desc()).offset((page - 1) * per_page).limit(per_page + 1).all()
+        has_next = len(products) > per_page
+        products = products[:per_page]
+        has_prev = page > 1
     
     return {
         "items": [ProductSchema.from_orm(p) for p in products],
         "total": total,
+        "total_is_estimate": total_is_estimate,
         "page": page,
         "per_page": per_page,
-        "pages": (total + per_page - 1) // per_page
+        "pages": (total + per_page - 1) // per_page if total is not None else None,
+        "next_after_id": products[-1].id if products and has_next else None,
+        "prev_before_id": products[0].id if products and has_prev else None,
     }
 
+def _export_chunks(db, statement, export_format):
+    """Encodes the rows of statement EXPORT_BATCH_SIZE at a time. yield_per
+    streams from a server-side (named) cursor on PostgreSQL, so only one
+    batch is held in memory however large the catalog is."""
+    try:
+        result = db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        
+        if export_format == "csv":
+            yield b"sku,name,description\n"
+        
+        for rows in result.partitions():
+            buf = io.StringIO()
+            if export_format == "csv":
+                csv.writer(buf, lineterminator="\n").writerows((row.sku, row.name, row.description or "") for row in rows)
+            else:
+                for row in rows:
+                    buf.write(json.dumps({
+                        "id": row.id,
+                        "sku": row.sku,
+                        "name": row.name,
+                        "description": row.description,
+                        "active": row.active,
+                    }))
+                    buf.write("\n")
+            yield buf.getvalue().encode("utf-8")
+    finally:
+        db.close()
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.get("/api/products/export")
+def export_products(
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    sku: Optional[str] = None,
+    name: Optional[str] = None,
+    active: Optional[bool] = None,
+    search: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Streams every product matching the list_products filters, oldest
+    first, as CSV in the import format (sku,name,description) or as NDJSON.
+    gzip=true compresses on the fly into a .gz download that /api/upload
+    accepts back as-is."""
+    statement = _apply_product_filters(
+        select(Product.id, Product.sku, Product.name, Product.description, Product.active),
+        sku, name, active, search,
+    ).order_by(Product.id)
+    
+    # get_db's cleanup runs before the body is sent, so the generator
+    # reuses the session after that and closes it once it is done
+    chunks = _export_chunks(db, statement, export_format)
+    filename = "products.csv" if export_format == "csv" else "products.ndjson"
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    if gzip:
+        chunks = _gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 @app.post("/api/products", response_model=ProductSchema)
 def create_product(product: ProductCreate, db: Session = Depends(get_db)):
+    product_data, has_events = _create_product(db, product)
+    _publish_product_changes([], has_events)
+    return product_data
+
+def _create_product(db: Session, product: ProductCreate, subscribed=None):
     sku_lower = product.sku.lower()
     existing = db.query(Product).filter(func.lower(Product.sku) == sku_lower).first()
     
@@ -146,15 +413,128 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     
     db_product = Product(**product.dict())
     db.add(db_product)
+    db.flush()
+    has_events = add_outbox_events(db, [("product.created", product_payload(db_product))], subscribed)
     db.commit()
     db.refresh(db_product)
     
-    trigger_webhooks.delay(db_product.id, "product.created")
+    return ProductSchema.from_orm(db_product), has_events
+
+def _publish_product_changes(product_ids, has_events):
+    """Runs once a product write has committed: retires the cached counts and
+    product_ids' cache entries, and schedules the outbox relay. These are
+    blocking Redis and broker calls, so the async routes run it in the
+    threadpool."""
+    bump_products_generation()
+    invalidate_products(product_ids)
+    
+    if has_events:
+        schedule_outbox_relay()
+
+def _commit_product_events(db: Session, events):
+    """Commits db with (event_type, payload) events added to the outbox, then
+    clears the caches and schedules the relay for the changed products."""
+    has_events = add_outbox_events(db, events)
+    db.commit()
+    _publish_product_changes(
+        [payload["id"] for event_type, payload in events if event_type != "product.created"], has_events
+    )
+
+@app.post("/api/products/batch", response_model=ProductBatchResult)
+def batch_upsert_products(batch: ProductBatchUpsert, db: Session = Depends(get_db)):
+    """Creates or updates up to PRODUCT_BATCH_MAX products by case-insensitive
+    SKU with one INSERT ... ON CONFLICT DO UPDATE (two when only some of them
+    set active). A later entry wins over an earlier one with the same SKU.
+    Products whose fields already match are not rewritten and get no event."""
+    if len(batch.products) > PRODUCT_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {PRODUCT_BATCH_MAX} products per batch")
+    
+    now = datetime.datetime.utcnow()
+    products = {p.sku.lower(): p for p in batch.products}
+    # A product that leaves out active keeps its current state, so those
+    # rows go in a statement that neither sets nor compares it
+    events = []
+    for sets_active in (True, False):
+        group = [p for p in products.values() if ("active" in p.model_fields_set) == sets_active]
+        if group:
+            events += _upsert_product_rows(db, group, now, sets_active)
+    _commit_product_events(db, events)
+    
+    created = sum(1 for event_type, _ in events if event_type == "product.created")
+    return ProductBatchResult(created=created, updated=len(events) - created, unchanged=len(products) - len(events))
+
+def _upsert_product_rows(db: Session, products, now, sets_active: bool):
+    fields = ("name", "description", "active") if sets_active else ("name", "description")
+    dialect = db.get_bind().dialect.name
+    stmt = UPSERT_INSERTS[dialect](Product).values(
+        [{**p.dict(), "created_at": now, "updated_at": now} for p in products]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[func.lower(Product.sku)],
+        set_={**{field: stmt.excluded[field] for field in fields}, "updated_at": stmt.excluded.updated_at},
+        where=or_(*(getattr(Product, field).is_distinct_from(stmt.excluded[field]) for field in fields)),
+    )
+    columns = (Product.id, Product.sku, Product.name, Product.description, Product.active)
+    
+    if dialect == "postgresql":
+        # xmax is 0 only on rows this statement inserted, as in COPY_MERGE_SQL
+        rows = db.execute(stmt.returning(*columns, literal_column("xmax = 0").label("inserted"))).all()
+        return [("product.created" if row.inserted else "product.updated", product_payload(row)) for row in rows]
+    
+    # SQLite has no xmax, so look up which SKUs already exist first
+    existing = set(db.scalars(
+        select(func.lower(Product.sku)).where(func.lower(Product.sku).in_([p.sku.lower() for p in products]))
+    ))
+    return [
+        ("product.updated" if row.sku.lower() in existing else "product.created", product_payload(row))
+        for row in db.execute(stmt.returning(*columns)).all()
+    ]
+
+@app.patch("/api/products", response_model=ProductBulkUpdateResult)
+def bulk_update_products(request: ProductBulkUpdate, db: Session = Depends(get_db)):
+    """Sets values on every product in ids and/or matching filter (the
+    list_products filters) with one UPDATE ... RETURNING. Products that
+    already have the values are skipped and get no event."""
+    values = request.values.dict(exclude_unset=True)
+    filters = _clean_product_filters(request.filter.dict()) if request.filter is not None else {}
+    
+    if not values:
+        raise HTTPException(status_code=400, detail="No values to set")
+    if "name" in values and not values["name"]:
+        raise HTTPException(status_code=400, detail="name cannot be empty")
+    if "active" in values and values["active"] is None:
+        raise HTTPException(status_code=400, detail="active cannot be null")
+    if request.ids is None and not filters:
+        raise HTTPException(status_code=400, detail="Pass ids or a non-empty filter")
+    if request.ids is not None and len(request.ids) > PRODUCT_PATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {PRODUCT_PATCH_MAX_IDS} ids per request")
+    
+    stmt = _apply_product_filters(update(Product), **filters)
+    if request.ids is not None:
+        stmt = stmt.where(Product.id.in_(request.ids))
+    stmt = (
+        stmt.where(or_(*(getattr(Product, field).is_distinct_from(value) for field, value in values.items())))
+        .values(**values, updated_at=datetime.datetime.utcnow())
+        .returning(Product.id, Product.sku, Product.name, Product.description, Product.active)
+        .execution_options(synchronize_session=False)
+    )
+    
+    events = [("product.updated", product_payload(row)) for row in db.execute(stmt).all()]
+    _commit_product_events(db, events)
     
-    return ProductSchema.from_orm(db_product)
+    return ProductBulkUpdateResult(updated=len(events))
 
 @app.get("/api/products/{product_id}", response_model=ProductSchema)
 def get_product(product_id: int, db: Session = Depends(get_db)):
+    cached = get_cached_product(product_id)
+    if cached is not None:
+        return cached
+    
+    product_data = _load_product(db, product_id)
+    cache_product(product_id, product_data.model_dump(mode="json"))
+    return product_data
+
+def _load_product(db: Session, product_id: int):
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -162,6 +542,11 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
 
 @app.put("/api/products/{product_id}", response_model=ProductSchema)
 def update_product(product_id: int, product_update: ProductUpdate, db: Session = Depends(get_db)):
+    product_data, has_events = _update_product(db, product_id, product_update)
+    _publish_product_changes([product_id], has_events)
+    return product_data
+
+def _update_product(db: Session, product_id: int, product_update: ProductUpdate, subscribed=None):
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -181,38 +566,110 @@ def update_product(product_id: int, product_update: ProductUpdate, db: Session =
     for field, value in update_data.items():
         setattr(product, field, value)
     
+    db.flush()
+    has_events = add_outbox_events(db, [("product.updated", product_payload(product))], subscribed)
     db.commit()
     db.refresh(product)
     
-    trigger_webhooks.delay(product.id, "product.updated")
-    
-    return ProductSchema.from_orm(product)
+    return ProductSchema.from_orm(product), has_events
 
 @app.delete("/api/products/{product_id}")
 def delete_product(product_id: int, db: Session = Depends(get_db)):
+    has_events = _delete_product(db, product_id)
+    _publish_product_changes([product_id], has_events)
+    return {"message": "Product deleted successfully"}
+
+def _delete_product(db: Session, product_id: int, subscribed=None):
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    trigger_webhooks.delay(product.id, "product.deleted")
-    
+    # The event carries the row as it was, since the relay runs after it is gone
+    has_events = add_outbox_events(db, [("product.deleted", product_payload(product))], subscribed)
     db.delete(product)
     db.commit()
+    return has_events
+
+@app.delete("/api/products", response_model=TaskResponse)
+def bulk_delete_products():
+    task = bulk_delete_products_task.delay()
     
+    return TaskResponse(
+        task_id=task.id,
+        message="Bulk delete started. Processing in background."
+    )
+
+# Async versions of the product routes. They share the database halves of the
+# handlers above but run them with AsyncSession.run_sync on the asyncpg
+# engine: database waits are awaited on the event loop instead of holding one
+# of Starlette's threadpool threads. The Redis cache and outbox relay calls
+# are blocking, so they run outside run_sync in the threadpool.
+
+async def _subscriptions_async(db: AsyncSession, event_type):
+    """get_webhook_subscriptions for the async routes."""
+    subscriptions, missing = await run_in_threadpool(read_cached_subscriptions, [event_type])
+    if missing:
+        subscriptions.update(await db.run_sync(query_subscriptions, missing))
+        await run_in_threadpool(cache_subscriptions, subscriptions, missing)
+    return {event_type: subs for event_type, subs in subscriptions.items() if subs}
+
+@app.get("/api/async/products", response_model=dict)
+async def list_products_async(
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    sku: Optional[str] = None,
+    name: Optional[str] = None,
+    active: Optional[bool] = None,
+    search: Optional[str] = None,
+    after_id: Optional[int] = Query(None, ge=1),
+    before_id: Optional[int] = Query(None, ge=1),
+    count: str = Query("exact", pattern="^(exact|estimated|none)$"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if after_id is not None and before_id is not None:
+        raise HTTPException(status_code=400, detail="Pass after_id or before_id, not both")
+    
+    filters = _clean_product_filters({"sku": sku, "name": name, "active": active, "search": search})
+    count_key, cached_total = await run_in_threadpool(lookup_count, filters) if count != "none" else (None, None)
+    page_data = await db.run_sync(_list_products, filters, page, per_page, after_id, before_id, count, cached_total)
+    if count_key is not None and not page_data["total_is_estimate"]:
+        await run_in_threadpool(store_count, count_key, page_data["total"])
+    return page_data
+
+@app.post("/api/async/products", response_model=ProductSchema)
+async def create_product_async(product: ProductCreate, db: AsyncSession = Depends(get_async_db)):
+    subscribed = await _subscriptions_async(db, "product.created")
+    product_data, has_events = await db.run_sync(_create_product, product, subscribed)
+    await run_in_threadpool(_publish_product_changes, [], has_events)
+    return product_data
+
+@app.get("/api/async/products/{product_id}", response_model=ProductSchema)
+async def get_product_async(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    cached = await run_in_threadpool(get_cached_product, product_id)
+    if cached is not None:
+        return cached
+    
+    product_data = await db.run_sync(_load_product, product_id)
+    await run_in_threadpool(cache_product, product_id, product_data.model_dump(mode="json"))
+    return product_data
+
+@app.put("/api/async/products/{product_id}", response_model=ProductSchema)
+async def update_product_async(product_id: int, product_update: ProductUpdate, db: AsyncSession = Depends(get_async_db)):
+    subscribed = await _subscriptions_async(db, "product.updated")
+    product_data, has_events = await db.run_sync(_update_product, product_id, product_update, subscribed)
+    await run_in_threadpool(_publish_product_changes, [product_id], has_events)
+    return product_data
+
+@app.delete("/api/async/products/{product_id}")
+async def delete_product_async(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    subscribed = await _subscriptions_async(db, "product.deleted")
+    has_events = await db.run_sync(_delete_product, product_id, subscribed)
+    await run_in_threadpool(_publish_product_changes, [product_id], has_events)
     return {"message": "Product deleted successfully"}
 
-@app.delete("/api/products")
-def bulk_delete_products(db: Session = Depends(get_db)):
-    products = db.query(Product).all()
-    count = len(products)
-    
-    for product in products:
-        trigger_webhooks.delay(product.id, "product.deleted")
-    
-    db.query(Product).delete()
-    db.commit()
-    
-    return {"message": f"Deleted {count} products successfully", "count": count}
+@app.get("/api/cache/stats")
+def get_cache_stats():
+    return cache_stats()
 
 @app.get("/api/webhooks", response_model=List[WebhookSchema])
 def list_webhooks(db: Session = Depends(get_db)):
@@ -225,6 +682,7 @@ def create_webhook(webhook: WebhookCreate, db: Session = Depends(get_db)):
     db.add(db_webhook)
     db.commit()
     db.refresh(db_webhook)
+    invalidate_webhook_subscriptions()
     return WebhookSchema.from_orm(db_webhook)
 
 @app.put("/api/webhooks/{webhook_id}", response_model=WebhookSchema)
@@ -239,6 +697,7 @@ def update_webhook(webhook_id: int, webhook_update: WebhookUpdate, db: Session =
     
     db.commit()
     db.refresh(webhook)
+    invalidate_webhook_subscriptions()
     return WebhookSchema.from_orm(webhook)
 
 @app.delete("/api/webhooks/{webhook_id}")
@@ -249,8 +708,17 @@ def delete_webhook(webhook_id: int, db: Session = Depends(get_db)):
     
     db.delete(webhook)
     db.commit()
+    invalidate_webhook_subscriptions()
     return {"message": "Webhook deleted successfully"}
 
+@app.get("/api/webhooks/{webhook_id}/stats")
+def webhook_stats(webhook_id: int, db: Session = Depends(get_db)):
+    webhook = db.query(Webhook).filter(Webhook.id == webhook_id).first()
+    if not webhook:
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    
+    return {"webhook_id": webhook_id, **get_webhook_stats(webhook_id)}
+
 @app.post("/api/webhooks/{webhook_id}/test")
 async def test_webhook(webhook_id: int, db: Session = Depends(get_db)):
     import httpx
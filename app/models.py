@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Index, func
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime, JSON, Index, func
 from sqlalchemy.sql import expression
 from app.database import Base
 import datetime
@@ -16,6 +16,14 @@ class Product(Base):
     
     __table_args__ = (
         Index('ix_products_sku_lower', func.lower(sku), unique=True),
+        # pg_trgm GIN indexes let the lower(col) LIKE '%term%' list filters
+        # use an index instead of a sequential scan (PostgreSQL only)
+        Index('ix_products_sku_trgm', func.lower(sku).label('sku_lower'),
+              postgresql_using='gin', postgresql_ops={'sku_lower': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_products_name_trgm', func.lower(name).label('name_lower'),
+              postgresql_using='gin', postgresql_ops={'name_lower': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_products_description_trgm', func.lower(description).label('description_lower'),
+              postgresql_using='gin', postgresql_ops={'description_lower': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
     )
 
 class Webhook(Base):
@@ -27,3 +35,29 @@ class Webhook(Base):
     enabled = Column(Boolean, default=True, server_default=expression.true())
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class OutboxEvent(Base):
+    """A product change event written in the same transaction as the change
+    and removed by the relay once every subscriber has accepted it.
+    payload is the product as committed, so deletes still carry their row.
+    After a failed delivery, webhook_ids holds the subscribers still owed the
+    event and attempts counts the relay runs that tried them."""
+    __tablename__ = "outbox_events"
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    event_type = Column(String(50), nullable=False)
+    product_id = Column(Integer, nullable=False)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    webhook_ids = Column(JSON)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class ImportBatch(Base):
+    """An import batch whose transaction committed, keyed by the importing
+    task and batch number. A batch replayed after a crash between its commit
+    and its Redis checkpoint finds its row and adds no outbox events again."""
+    __tablename__ = "import_batches"
+    
+    import_id = Column(String(155), primary_key=True)
+    batch = Column(Integer, primary_key=True, autoincrement=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -0,0 +1,125 @@
+import cProfile
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # optional, only needed for profile="pyinstrument"
+    Profiler = None
+
+# Where per-task profiles are written
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+PROFILE_MODES = ("cprofile", "pyinstrument")
+
+def pyinstrument_available():
+    return Profiler is not None
+
+class StageTimer:
+    """Cumulative wall time per named stage of a task, with a latency
+    histogram per stage.
+    
+    Histogram buckets are powers of two in milliseconds and count the
+    samples at or below that bound (and above the previous one). record()
+    is thread-safe, so the progress publishing thread can report into the
+    same timer as the row loop; its time overlaps the other stages rather
+    than adding to them.
+    """
+    
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+    
+    def record(self, name: str, seconds: float):
+        ms = seconds * 1000
+        bucket = str(2 ** math.ceil(math.log2(ms))) if ms > 1 else "1"
+        
+        with self._lock:
+            stage = self._stages.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "histogram_ms": {}})
+            stage["count"] += 1
+            stage["total_ms"] += ms
+            stage["max_ms"] = max(stage["max_ms"], ms)
+            stage["histogram_ms"][bucket] = stage["histogram_ms"].get(bucket, 0) + 1
+    
+    def summary(self):
+        """JSON-ready {stage: {count, total_ms, mean_ms, max_ms, histogram_ms}}."""
+        with self._lock:
+            return {
+                name: {
+                    "count": stage["count"],
+                    "total_ms": round(stage["total_ms"], 2),
+                    "mean_ms": round(stage["total_ms"] / stage["count"], 2),
+                    "max_ms": round(stage["max_ms"], 2),
+                    "histogram_ms": dict(sorted(stage["histogram_ms"].items(), key=lambda item: int(item[0]))),
+                }
+                for name, stage in self._stages.items()
+            }
+
+def merge_stage_summaries(summaries):
+    """Combines StageTimer summaries, e.g. from the shards of one import."""
+    merged = {}
+    for summary in summaries:
+        for name, stage in (summary or {}).items():
+            total = merged.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "histogram_ms": {}})
+            total["count"] += stage["count"]
+            total["total_ms"] += stage["total_ms"]
+            total["max_ms"] = max(total["max_ms"], stage["max_ms"])
+            for bucket, count in stage["histogram_ms"].items():
+                total["histogram_ms"][bucket] = total["histogram_ms"].get(bucket, 0) + count
+    
+    for stage in merged.values():
+        stage["total_ms"] = round(stage["total_ms"], 2)
+        stage["mean_ms"] = round(stage["total_ms"] / stage["count"], 2) if stage["count"] else 0
+        stage["histogram_ms"] = dict(sorted(stage["histogram_ms"].items(), key=lambda item: int(item[0])))
+    return merged
+
+@contextmanager
+def capture_profile(mode: str, name: str):
+    """Profiles the block with cProfile or pyinstrument when mode is set.
+    
+    Yields a dict that gets "profile" (the path written under PROFILE_DIR:
+    {name}.prof for pstats / snakeviz, {name}.html for pyinstrument) once
+    the block has finished. With no mode it does nothing.
+    """
+    info = {}
+    if not mode:
+        yield info
+        return
+    
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode!r}, expected one of {', '.join(PROFILE_MODES)}")
+    if mode == "pyinstrument" and Profiler is None:
+        raise ValueError("profile=pyinstrument requires the pyinstrument package")
+    
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield info
+        finally:
+            profiler.disable()
+            info["profile"] = os.path.join(PROFILE_DIR, f"{name}.prof")
+            profiler.dump_stats(info["profile"])
+    else:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield info
+        finally:
+            profiler.stop()
+            info["profile"] = os.path.join(PROFILE_DIR, f"{name}.html")
+            with open(info["profile"], "w") as f:
+                f.write(profiler.output_html())
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from typing import Dict, Set
+
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+class ProgressHub:
+    """Fans task progress out from Redis to every SSE client in this process.
+    
+    One pooled Redis client and one psubscribe("progress:*") are shared by all
+    connections; each connected client gets a bounded asyncio.Queue for its
+    task_id. A client that falls behind loses its oldest queued updates rather
+    than blocking the listener.
+    """
+    
+    def __init__(self, redis_url: str, max_connections: int = 20, queue_size: int = 100):
+        self.redis_url = redis_url
+        self.max_connections = max_connections
+        self.queue_size = queue_size
+        self.redis = None
+        self._listener = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+    
+    async def start(self):
+        self.redis = aioredis.from_url(self.redis_url, max_connections=self.max_connections)
+        self._listener = asyncio.create_task(self._listen())
+    
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self.redis is not None:
+            await self.redis.close()
+            self.redis = None
+    
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.psubscribe("progress:*")
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self._dispatch(message["channel"].decode(), message["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Progress hub lost its Redis subscription, retrying: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+    
+    def _dispatch(self, channel: str, data: str):
+        task_id = channel.split(":", 1)[1]
+        for queue in self._subscribers.get(task_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(data)
+    
+    def subscribe(self, task_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        return queue
+    
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(task_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[task_id]
+    
+    @property
+    def connection_count(self):
+        return sum(len(queues) for queues in self._subscribers.values())
+    
+    async def get_status(self, task_id: str):
+        status = await self.redis.get(f"task_status:{task_id}")
+        return status.decode() if status else None
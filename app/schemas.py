@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, HttpUrl
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class ProductBase(BaseModel):
@@ -25,6 +25,33 @@ class Product(ProductBase):
     class Config:
         from_attributes = True
 
+class ProductBatchUpsert(BaseModel):
+    products: List[ProductCreate] = Field(..., min_length=1)
+
+class ProductBatchResult(BaseModel):
+    created: int
+    updated: int
+    unchanged: int
+
+class ProductFilter(BaseModel):
+    sku: Optional[str] = None
+    name: Optional[str] = None
+    active: Optional[bool] = None
+    search: Optional[str] = None
+
+class ProductBulkValues(BaseModel):
+    name: Optional[str] = Field(None, max_length=500)
+    description: Optional[str] = None
+    active: Optional[bool] = None
+
+class ProductBulkUpdate(BaseModel):
+    ids: Optional[List[int]] = None
+    filter: Optional[ProductFilter] = None
+    values: ProductBulkValues
+
+class ProductBulkUpdateResult(BaseModel):
+    updated: int
+
 class WebhookBase(BaseModel):
     url: str = Field(..., max_length=2048)
     event_type: str = Field(..., max_length=50)
@@ -46,10 +73,13 @@ class Webhook(WebhookBase):
     class Config:
         from_attributes = True
 
-class UploadResponse(BaseModel):
+class TaskResponse(BaseModel):
     task_id: str
     message: str
 
+class UploadResponse(TaskResponse):
+    pass
+
 class ProgressUpdate(BaseModel):
     task_id: str
     status: str
@@ -1,14 +1,31 @@
 import csv
+import io
+import itertools
 import json
+import threading
 import time
-from sqlalchemy import func
+import zlib
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from celery import chord
+from sqlalchemy import func, delete, insert, select, text, update
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from app.celery_app import celery_app
 from app.database import SessionLocal
-from app.models import Product, Webhook
+from app.models import ImportBatch, OutboxEvent, Product
+from app.webhook_delivery import deliver_webhooks
+from app.upload_stream import RedisStreamReader
+from app.compression import open_upload
+from app.arrow_parser import iter_normalized_batches
+from app.profiling import StageTimer, capture_profile, merge_stage_summaries
+from app.cache import (
+    bump_products_generation,
+    get_webhook_subscriptions,
+    invalidate_products,
+    invalidate_all_products,
+)
 import redis
 import os
-import httpx
 import logging
 import uuid
 from typing import List, Dict
@@ -33,124 +50,981 @@ print(f"Redis URL configured: {REDIS_URL[:20]}...")  # Print first 20 chars for
 redis_client = redis.from_url(REDIS_URL)
 
 CHUNK_SIZE = 1000
+BULK_DELETE_CHUNK_SIZE = int(os.getenv("BULK_DELETE_CHUNK_SIZE", "5000"))
+
+# "individual" posts one event per product; "envelope" posts one
+# {"event", "products": [...]} body per webhook and event type
+WEBHOOK_DELIVERY_MODE = os.getenv("WEBHOOK_DELIVERY_MODE", "individual").lower()
+COPY_CHUNK_SIZE = int(os.getenv("COPY_CHUNK_SIZE", "50000"))
+
+# Skip the separate row-counting pass and report progress by bytes consumed
+IMPORT_SINGLE_PASS = os.getenv("IMPORT_SINGLE_PASS", "true").lower() in ("1", "true", "yes")
+
+# Fan imports out to IMPORT_SHARDS parallel shard tasks once the upload is large enough
+IMPORT_SHARDS = int(os.getenv("IMPORT_SHARDS", "1"))
+IMPORT_SHARD_MIN_BYTES = int(os.getenv("IMPORT_SHARD_MIN_BYTES", str(8 * 1024 * 1024)))
+
+# "auto" uses COPY + ON CONFLICT on PostgreSQL and the ORM path elsewhere (SQLite in tests)
+IMPORT_ENGINE = os.getenv("IMPORT_ENGINE", "auto").lower()
+
+# Upsert batches start at CHUNK_SIZE (ORM) / COPY_CHUNK_SIZE (COPY) rows and are
+# resized after every batch toward IMPORT_BATCH_TARGET_MS of upsert + commit time,
+# within IMPORT_BATCH_MIN..IMPORT_BATCH_MAX (default: a tenth to twice the start).
+# The whole batch is buffered as row dicts (plus the COPY text on PostgreSQL),
+# roughly 0.5-1 KB per row, so 100k-row COPY batches already take 50-100 MB of
+# a worker child's --max-memory-per-child budget; raise the maximum with care
+IMPORT_BATCH_ADAPTIVE = os.getenv("IMPORT_BATCH_ADAPTIVE", "true").lower() in ("1", "true", "yes")
+IMPORT_BATCH_TARGET_MS = float(os.getenv("IMPORT_BATCH_TARGET_MS", "750"))
+IMPORT_BATCH_MIN = int(os.getenv("IMPORT_BATCH_MIN", "0"))
+IMPORT_BATCH_MAX = int(os.getenv("IMPORT_BATCH_MAX", "0"))
+
+# Change events go to the outbox_events table in the transaction that made the
+# change; a relay task delivers them OUTBOX_RELAY_DELAY seconds later in
+# batches of up to OUTBOX_BATCH_SIZE, so a burst of changes shares one task
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "1000"))
+OUTBOX_RELAY_DELAY = float(os.getenv("OUTBOX_RELAY_DELAY", "1"))
+OUTBOX_RELAY_PENDING_KEY = "outbox:relay_pending"
+# An event is retried by later relay runs until every subscriber accepts it;
+# after OUTBOX_MAX_ATTEMPTS failed runs it stays in the table as a dead letter
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+# pg_advisory_lock key that keeps relay runs from overlapping
+OUTBOX_RELAY_LOCK_KEY = 0x6f7574626f78
+
+# Rows whose name and description already match the stored product are left
+# untouched: no UPDATE, no updated_at bump and no product.updated webhook
+IMPORT_SKIP_UNCHANGED = os.getenv("IMPORT_SKIP_UNCHANGED", "true").lower() in ("1", "true", "yes")
+
+# Import checkpoints and webhook batch claims outlive a redelivered task by this long (seconds)
+IMPORT_CHECKPOINT_TTL = int(os.getenv("IMPORT_CHECKPOINT_TTL", str(24 * 3600)))
+
+# "csv" parses row by row with csv.DictReader; "arrow" parses and normalizes
+# whole blocks with pyarrow (needs the pyarrow package)
+IMPORT_PARSER = os.getenv("IMPORT_PARSER", "csv").lower()
+
+# Progress updates from a running task are coalesced to at most one publish per interval (seconds)
+PROGRESS_MIN_INTERVAL = float(os.getenv("PROGRESS_MIN_INTERVAL", "0.25"))
+
+# Profile every import with "cprofile" or "pyinstrument" (see app.profiling);
+# a single import can also ask for it with /api/upload?profile=...
+IMPORT_PROFILE = os.getenv("IMPORT_PROFILE", "").lower()
+
+COPY_STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS products_staging (
+    sku VARCHAR(255) NOT NULL,
+    name VARCHAR(500) NOT NULL,
+    description TEXT
+) ON COMMIT DELETE ROWS
+"""
+
+COPY_STAGING_SQL = "COPY products_staging (sku, name, description) FROM STDIN WITH (FORMAT csv)"
+
+COPY_MERGE_SQL = """
+INSERT INTO products (sku, name, description, active, created_at, updated_at)
+SELECT sku, name, description, TRUE, timezone('utc', now()), timezone('utc', now())
+FROM products_staging
+ON CONFLICT (lower(sku)) DO UPDATE
+SET name = EXCLUDED.name,
+    description = EXCLUDED.description,
+    updated_at = EXCLUDED.updated_at
+{change_filter}RETURNING id, (xmax = 0) AS inserted, sku, name, description, active
+"""
+
+# Conflicting rows that fail the WHERE are neither updated nor returned
+COPY_MERGE_CHANGED_FILTER = """WHERE (products.name, products.description)
+    IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.description)
+"""
 
 logger = logging.getLogger(__name__)
 
-def publish_progress(task_id: str, status: str, progress: float, message: str, total_rows: int = 0, processed_rows: int = 0):
-    data = {
+def publish_progress(task_id: str, status: str, progress: float, message: str, total_rows: int = 0, processed_rows: int = 0, extra: Dict = None):
+    data = json.dumps({
         "task_id": task_id,
         "status": status,
         "progress": progress,
         "message": message,
         "total_rows": total_rows,
         "processed_rows": processed_rows,
-    }
-    redis_client.publish(f"progress:{task_id}", json.dumps(data))
-    redis_client.setex(f"task_status:{task_id}", 3600, json.dumps(data))
+        **(extra or {}),
+    })
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.publish(f"progress:{task_id}", data)
+    pipe.setex(f"task_status:{task_id}", 3600, data)
+    pipe.execute()
 
-@celery_app.task(bind=True)
-def import_csv_task(self, file_path: str, file_size: int = 0):
-    task_id = self.request.id
-    db = SessionLocal()
+class ProgressReporter:
+    """Publishes progress from a background thread so Redis latency stays out
+    of the row loop.
     
-    try:
-        publish_progress(task_id, "counting", 0, "Counting CSV rows...")
-        
-        total_data_rows = 0
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
+    update() only records the latest arguments for publish(); the thread
+    sends them at most once per min_interval, so intermediate updates are
+    coalesced. close() flushes whatever is still pending and stops the
+    thread. Terminal completed/failed states are published by the caller
+    after close(), so they are always the last message on the channel.
+    """
+    
+    def __init__(self, publish, min_interval: float = None):
+        self._publish = publish
+        self._min_interval = PROGRESS_MIN_INTERVAL if min_interval is None else min_interval
+        self._pending = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def update(self, *args):
+        with self._cond:
+            self._pending = args
+            self._cond.notify()
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._closed)
+                pending, self._pending = self._pending, None
+                closed = self._closed
             
-            if not reader.fieldnames or 'sku' not in reader.fieldnames or 'name' not in reader.fieldnames:
-                raise ValueError("CSV must contain 'sku' and 'name' columns")
+            if pending is not None:
+                try:
+                    self._publish(*pending)
+                except Exception as e:
+                    logger.warning(f"Failed to publish progress: {e}")
             
-            for row in reader:
-                if row.get('sku', '').strip() and row.get('name', '').strip():
-                    total_data_rows += 1
+            if closed:
+                return
+            
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed, timeout=self._min_interval)
+    
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+class _CountingLineReader:
+    """Yields decoded lines from a binary file while tracking bytes consumed,
+    so progress can be reported against the file size in a single pass. A
+    UTF-8 byte order mark at the start of the file is dropped, as the API
+    does when it checks the header."""
+    
+    def __init__(self, f, encoding='utf-8'):
+        self._f = f
+        self._encoding = encoding
+        self.bytes_read = 0
+    
+    def __iter__(self):
+        for line in self._f:
+            encoding = 'utf-8-sig' if self.bytes_read == 0 and self._encoding == 'utf-8' else self._encoding
+            self.bytes_read += len(line)
+            yield line.decode(encoding)
+    
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self.bytes_read += len(data)
+        return data
+    
+    @property
+    def closed(self):
+        return self._f.closed
+    
+    def seek(self, offset):
+        if self._f.seekable():
+            self._f.seek(offset)
+        else:
+            # Forward-only sources (upload streams) skip ahead by reading
+            remaining = offset - self.bytes_read
+            while remaining > 0:
+                chunk = self._f.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+        self.bytes_read = offset
+
+class ImportCheckpoint:
+    """Position of an import in Redis, keyed by the Celery task id.
+    
+    With task_acks_late a worker that dies mid-import gets the task
+    redelivered under the same id, so the import can pick up after the last
+    batch it committed instead of re-reading the file from the first row.
+    """
+    
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.key = f"import_checkpoint:{task_id}"
+    
+    def load(self):
+        try:
+            data = redis_client.hgetall(self.key)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to load import checkpoint: {e}")
+            return None
         
-        if total_data_rows == 0:
-            publish_progress(task_id, "completed", 100, "No valid rows to import", 0, 0)
-            return {"status": "success", "total_csv_rows": 0, "unique_products": 0}
+        state = {k.decode(): int(v) for k, v in data.items()}
+        return state or None
+    
+    def save(self, **fields):
+        pipe = redis_client.pipeline()
+        pipe.hset(self.key, mapping=fields)
+        pipe.expire(self.key, IMPORT_CHECKPOINT_TTL)
+        pipe.execute()
+    
+    def clear(self):
+        redis_client.delete(self.key)
+
+class _StreamCheckpoint(ImportCheckpoint):
+    """Checkpoint of a stream import that also trims the upload stream up to
+    each saved byte offset, so Redis only holds the part of the upload a
+    resumed import still needs. Arrow imports checkpoint records, not
+    offsets, and keep the whole stream."""
+    
+    def __init__(self, task_id, stream):
+        super().__init__(task_id)
+        self.stream = stream
+    
+    def save(self, **fields):
+        super().save(**fields)
+        if "offset" in fields:
+            try:
+                self.stream.trim(fields["offset"])
+            except redis.RedisError as e:
+                logger.warning(f"Failed to trim upload stream: {e}")
+
+def _csv_dict_reader(lines):
+    reader = csv.DictReader(lines)
+    
+    if not reader.fieldnames or 'sku' not in reader.fieldnames or 'name' not in reader.fieldnames:
+        raise ValueError("CSV must contain 'sku' and 'name' columns")
+    
+    return reader
+
+def _count_csv_rows(file_path):
+    total_data_rows = 0
+    with open_upload(file_path) as (f, _):
+        reader = _csv_dict_reader(_CountingLineReader(f))
         
-        publish_progress(task_id, "importing", 5, f"Found {total_data_rows} rows to import", total_data_rows, 0)
+        for row in reader:
+            if row.get('sku', '').strip() and row.get('name', '').strip():
+                total_data_rows += 1
+    
+    return total_data_rows
+
+def _split_csv_by_sku(file_path, shard_count):
+    """Partition valid rows into shard files by a stable hash of lower(sku), so
+    every duplicate of a SKU lands in the same shard and keeps its file order
+    (last row wins). Returns (shard_paths, total_data_rows)."""
+    shard_paths = [f"{file_path}.shard{i}" for i in range(shard_count)]
+    shard_files = [open(path, 'w', encoding='utf-8', newline='') for path in shard_paths]
+    total_data_rows = 0
+    
+    try:
+        writers = [csv.writer(sf) for sf in shard_files]
+        for writer in writers:
+            writer.writerow(['sku', 'name', 'description'])
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            
-            rows_processed = 0
-            unique_products_saved = 0
-            all_seen_skus = set()
-            current_batch = {}
-            last_progress_row = 0
-            last_progress_time = time.time()
-            PROGRESS_ROW_INTERVAL = 100
-            PROGRESS_TIME_INTERVAL = 0.5
+        with open_upload(file_path) as (f, _):
+            reader = _csv_dict_reader(_CountingLineReader(f))
             
             for row in reader:
                 sku = row.get('sku', '').strip()
                 name = row.get('name', '').strip()
-                description = row.get('description', '').strip()
                 
                 if not sku or not name:
                     continue
                 
-                rows_processed += 1
-                sku_lower = sku.lower()
-                
-                all_seen_skus.add(sku_lower)
-                current_batch[sku_lower] = {
-                    'sku': sku,
-                    'name': name,
-                    'description': description if description else None,
-                    'active': True
-                }
-                
-                current_time = time.time()
-                should_publish = (
-                    rows_processed - last_progress_row >= PROGRESS_ROW_INTERVAL or
-                    current_time - last_progress_time >= PROGRESS_TIME_INTERVAL
-                )
-                
-                if should_publish:
-                    progress = 5 + (rows_processed / total_data_rows) * 85
-                    publish_progress(task_id, "importing", progress, 
-                                   f"Processing: {rows_processed}/{total_data_rows} rows ({len(all_seen_skus)} unique, {unique_products_saved} saved)",
-                                   total_data_rows, rows_processed)
-                    last_progress_row = rows_processed
-                    last_progress_time = current_time
-                
-                if len(current_batch) >= CHUNK_SIZE:
-                    batch_data = list(current_batch.values())
-                    result = _bulk_upsert_products(db, batch_data)
-                    
-                    for product_id, event_type in result:
-                        trigger_webhooks.delay(product_id, event_type)
-                    
-                    unique_products_saved += len(batch_data)
-                    current_batch = {}
+                total_data_rows += 1
+                shard = zlib.crc32(sku.lower().encode('utf-8')) % shard_count
+                writers[shard].writerow([sku, name, row.get('description') or ''])
+    except Exception:
+        _remove_files(shard_paths)
+        raise
+    finally:
+        for sf in shard_files:
+            sf.close()
+    
+    return shard_paths, total_data_rows
+
+class _ShardAborted(Exception):
+    """Raised in a shard whose sibling failed, to stop importing early."""
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Failed to remove temp file: {e}")
+
+class _UniqueSkuCounter:
+    """Distinct-SKU estimate for progress messages, kept in a Redis
+    HyperLogLog (at most 12 KB, ~0.8% standard error) instead of a set of
+    every SKU, so worker memory stays flat whatever the file size. Shards of
+    one import share the parent's key, so the count covers the whole file.
+    
+    add() only buffers; flush() sends the buffer with PFADD and returns the
+    current PFCOUNT in one round trip.
+    """
+    
+    PFADD_CHUNK = 10000
+    
+    def __init__(self, import_id):
+        self.key = f"import_skus:{import_id}"
+        self.pending = []
+        self.count = 0
+    
+    def add(self, sku_lower):
+        self.pending.append(sku_lower)
+    
+    def extend(self, skus):
+        self.pending.extend(skus)
+    
+    def flush(self):
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for i in range(0, len(self.pending), self.PFADD_CHUNK):
+                pipe.pfadd(self.key, *self.pending[i:i + self.PFADD_CHUNK])
+            pipe.expire(self.key, IMPORT_CHECKPOINT_TTL)
+            pipe.pfcount(self.key)
+            self.count = pipe.execute()[-1]
+        except redis.RedisError as e:
+            logger.warning(f"Failed to update unique SKU count: {e}")
+        
+        self.pending = []
+        return self.count
+    
+    def clear(self):
+        redis_client.delete(self.key)
+
+class AdaptiveBatchSizer:
+    """Steers the upsert batch size toward a target latency per batch.
+    
+    After each batch the per-row latency, smoothed with an EWMA, gives the
+    size that would take target_ms. The next size moves toward it by at most
+    a factor of two either way and stays within [minimum, maximum].
+    """
+    
+    SMOOTHING = 0.3
+    
+    def __init__(self, initial: int, minimum: int, maximum: int, target_ms: float, adaptive: bool = True):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.size = min(max(initial, self.minimum), self.maximum)
+        self.initial = self.size
+        self.target_ms = target_ms
+        self.adaptive = adaptive
+        self.ms_per_row = None
+        self.batches = 0
+        self.smallest = None
+        self.largest = None
+    
+    def record(self, rows: int, seconds: float):
+        self.batches += 1
+        self.smallest = rows if self.smallest is None else min(self.smallest, rows)
+        self.largest = rows if self.largest is None else max(self.largest, rows)
+        
+        if not self.adaptive or rows == 0:
+            return
+        
+        ms_per_row = seconds * 1000 / rows
+        if self.ms_per_row is None:
+            self.ms_per_row = ms_per_row
+        else:
+            self.ms_per_row += self.SMOOTHING * (ms_per_row - self.ms_per_row)
+        
+        desired = self.target_ms / max(self.ms_per_row, 1e-6)
+        desired = min(max(desired, self.size / 2), self.size * 2)
+        self.size = int(min(max(desired, self.minimum), self.maximum))
+    
+    def summary(self):
+        return {
+            "initial": self.initial,
+            "final": self.size,
+            "min": self.smallest,
+            "max": self.largest,
+            "batches": self.batches,
+            "target_ms": self.target_ms if self.adaptive else None,
+        }
+
+class _BatchUpserter:
+    """Upserts ready-to-load batches with the configured engine and does the
+    per-batch bookkeeping: cache invalidation, scheduling the outbox relay,
+    batch resizing and, with a checkpoint, saving the caller's position after
+    each committed batch.
+    
+    The engines write each batch's change events to the outbox in the batch's
+    own transaction, together with its import_batches ledger row. state is a checkpoint left by an earlier delivery of the
+    task. Every step is timed into timer.
+    
+    changes counts the rows written as created, updated and (with
+    IMPORT_SKIP_UNCHANGED) unchanged.
+    """
+    
+    def __init__(self, db, checkpoint=None, state=None, timer=None):
+        engine_name = _resolve_import_engine(db)
+        state = state or {}
+        initial = COPY_CHUNK_SIZE if engine_name == "copy" else CHUNK_SIZE
+        
+        self.db = db
+        self.timer = timer or StageTimer()
+        self.upsert_batch = _copy_upsert_products if engine_name == "copy" else _bulk_upsert_products
+        self.sizer = AdaptiveBatchSizer(
+            state.get("batch_size", initial),
+            IMPORT_BATCH_MIN or max(1, initial // 10),
+            IMPORT_BATCH_MAX or initial * 2,
+            IMPORT_BATCH_TARGET_MS,
+            IMPORT_BATCH_ADAPTIVE,
+        )
+        self.checkpoint = checkpoint
+        self.batch_number = state.get("batch", 0)
+        self.saved = state.get("saved", 0)
+        self.changes = {key: state.get(key, 0) for key in ("created", "updated", "unchanged")}
+    
+    @property
+    def batch_size(self):
+        return self.sizer.size
+    
+    def write(self, batch_data):
+        # A resumed import restores the batch number and size from its
+        # checkpoint, so a replayed batch gets the key it committed under
+        batch_key = (self.checkpoint.task_id, self.batch_number + 1) if self.checkpoint is not None else None
+        start = time.perf_counter()
+        result = self.upsert_batch(self.db, batch_data, self.timer, batch_key)
+        self.sizer.record(len(batch_data), time.perf_counter() - start)
+        self.batch_number += 1
+        
+        created = sum(1 for _, event_type in result if event_type == "product.created")
+        self.changes["created"] += created
+        self.changes["updated"] += len(result) - created
+        self.changes["unchanged"] += len(batch_data) - len(result)
+        
+        with self.timer.stage("cache_invalidate"):
+            bump_products_generation()
+            invalidate_products([pid for pid, event_type in result if event_type == "product.updated"])
+        
+        if result:
+            with self.timer.stage("relay_schedule"):
+                schedule_outbox_relay()
+        
+        self.saved += len(batch_data)
+    
+    def save_checkpoint(self, **position):
+        if self.checkpoint is not None:
+            with self.timer.stage("checkpoint"):
+                self.checkpoint.save(batch=self.batch_number, saved=self.saved, batch_size=self.batch_size, **self.changes, **position)
+
+def _import_rows(db, reader, on_progress, sku_counter, line_reader=None, checkpoint=None, timer=None):
+    """Core upsert loop shared by whole-file and shard imports.
+    
+    Calls on_progress(rows_processed, unique_count, saved_count, batch_size) at
+    most every PROGRESS_ROW_INTERVAL rows / PROGRESS_TIME_INTERVAL seconds and
+    once after the last batch, and returns (rows_processed, unique_products_saved, batch_sizes, changes) where
+    batch_sizes summarizes the adaptive batch sizes used and changes counts
+    the created, updated and unchanged products.
+    
+    Stage times go to timer. Time spent reading and normalizing rows between
+    two batch writes is recorded as one "parse" sample per batch, so the row
+    loop itself carries no per-row timing. The unique SKU estimate is sent to
+    Redis once per committed batch, so progress messages report the count as
+    of the last commit and the row loop makes no Redis round trips.
+    
+    With a checkpoint, line_reader's byte offset and the running counts are
+    saved after every committed batch, and a checkpoint left by an earlier
+    delivery of the same task moves line_reader past the batches it already
+    committed.
+    """
+    rows_processed = 0
+    current_batch = {}
+    last_progress_row = 0
+    last_progress_time = time.time()
+    PROGRESS_ROW_INTERVAL = 100
+    PROGRESS_TIME_INTERVAL = 0.5
+    
+    state = checkpoint.load() if checkpoint is not None else None
+    if state:
+        line_reader.seek(state["offset"])
+        rows_processed = state["rows"]
+        logger.info(f"Resuming import {checkpoint.task_id} at byte {state['offset']} after batch {state['batch']}")
+    
+    upserter = _BatchUpserter(db, checkpoint, state, timer)
+    timer = upserter.timer
+    unique_count = sku_counter.count
+    segment_start = time.perf_counter()
+    
+    for row in reader:
+        sku = row.get('sku', '').strip()
+        name = row.get('name', '').strip()
+        description = row.get('description', '').strip()
+        
+        if not sku or not name:
+            continue
+        
+        rows_processed += 1
+        sku_lower = sku.lower()
+        
+        sku_counter.add(sku_lower)
+        current_batch[sku_lower] = {
+            'sku': sku,
+            'name': name,
+            'description': description if description else None,
+            'active': True
+        }
+        
+        current_time = time.time()
+        should_publish = (
+            rows_processed - last_progress_row >= PROGRESS_ROW_INTERVAL or
+            current_time - last_progress_time >= PROGRESS_TIME_INTERVAL
+        )
+        
+        if should_publish:
+            on_progress(rows_processed, unique_count, upserter.saved, upserter.batch_size)
+            last_progress_row = rows_processed
+            last_progress_time = current_time
+        
+        if len(current_batch) >= upserter.batch_size:
+            timer.record("parse", time.perf_counter() - segment_start)
+            upserter.write(list(current_batch.values()))
+            upserter.save_checkpoint(offset=line_reader.bytes_read, rows=rows_processed)
+            with timer.stage("unique_count"):
+                unique_count = sku_counter.flush()
+            current_batch = {}
+            segment_start = time.perf_counter()
+    
+    timer.record("parse", time.perf_counter() - segment_start)
+    if current_batch:
+        upserter.write(list(current_batch.values()))
+        upserter.save_checkpoint(offset=line_reader.bytes_read, rows=rows_processed)
+    
+    with timer.stage("unique_count"):
+        unique_count = sku_counter.flush()
+    on_progress(rows_processed, unique_count, upserter.saved, upserter.batch_size)
+    return rows_processed, upserter.saved, upserter.sizer.summary(), upserter.changes
+
+def _import_arrow(db, f, on_progress, sku_counter, checkpoint=None, timer=None):
+    """IMPORT_PARSER=arrow counterpart of _import_rows. pyarrow parses and
+    normalizes whole blocks column-wise and each block is upserted in
+    batch_size slices. Checkpoints count the CSV records consumed at block
+    boundaries, so a resumed import re-parses but doesn't re-upsert the
+    blocks before it."""
+    rows_processed = 0
+    records = 0
+    
+    state = checkpoint.load() if checkpoint is not None else None
+    if state:
+        records = state["records"]
+        rows_processed = state["rows"]
+        logger.info(f"Resuming import {checkpoint.task_id} after {records} records, batch {state['batch']}")
+    
+    upserter = _BatchUpserter(db, checkpoint, state, timer)
+    timer = upserter.timer
+    blocks = iter_normalized_batches(f, skip_records=records)
+    
+    while True:
+        with timer.stage("parse"):
+            block = next(blocks, None)
+        if block is None:
+            break
+        
+        block_records, valid_rows, products, keys = block
+        records += block_records
+        rows_processed += valid_rows
+        sku_counter.extend(keys)
+        
+        # The size is fixed per block so a replayed block is sliced (and its
+        # webhook batches numbered) the same way as the first time
+        batch_size = upserter.batch_size
+        for i in range(0, len(products), batch_size):
+            upserter.write(products[i:i + batch_size])
+        
+        upserter.save_checkpoint(records=records, rows=rows_processed)
+        with timer.stage("unique_count"):
+            unique_count = sku_counter.flush()
+        on_progress(rows_processed, unique_count, upserter.saved, upserter.batch_size)
+    
+    return rows_processed, upserter.saved, upserter.sizer.summary(), upserter.changes
+
+def _fan_out_import(task_id, file_path, shard_count, profile=None):
+    checkpoint = ImportCheckpoint(task_id)
+    state = checkpoint.load()
+    if state and "shards" in state:
+        # Redelivered after the chord was already dispatched
+        return {"status": "sharded", "total_csv_rows": state["total"], "shards": state["shards"]}
+    
+    publish_progress(task_id, "splitting", 0, f"Splitting CSV into {shard_count} shards...")
+    
+    shard_paths, total_data_rows = _split_csv_by_sku(file_path, shard_count)
+    
+    if total_data_rows == 0:
+        _remove_files(shard_paths + [file_path])
+        publish_progress(task_id, "completed", 100, "No valid rows to import", 0, 0)
+        return {"status": "success", "total_csv_rows": 0, "unique_products": 0}
+    
+    redis_client.delete(f"import_shards:{task_id}")
+    _UniqueSkuCounter(task_id).clear()
+    publish_progress(task_id, "importing", 5, f"Found {total_data_rows} rows to import in {shard_count} shards", total_data_rows, 0)
+    
+    # Checkpointed first, so a redelivery can never dispatch a second chord
+    # over the same shard files; at worst it finds a chord that never started
+    checkpoint.save(shards=shard_count, total=total_data_rows)
+    try:
+        chord(
+            import_csv_shard_task.s(task_id, shard_path, total_data_rows, profile)
+            for shard_path in shard_paths
+        )(
+            finalize_sharded_import.s(task_id, file_path, total_data_rows)
+            .on_error(fail_sharded_import.s(task_id, file_path, shard_paths))
+        )
+    except Exception:
+        checkpoint.clear()
+        _remove_files(shard_paths)
+        raise
+    
+    return {"status": "sharded", "total_csv_rows": total_data_rows, "shards": shard_count}
+
+def _describe_changes(changes):
+    return f"{changes['created']} created, {changes['updated']} updated, {changes['unchanged']} unchanged"
+
+def _import_file_object(db, task_id, f, file_size, total_data_rows=0, position=None, profile=None, checkpoint=None):
+    """Imports an open binary CSV and publishes the completed state. Without a
+    known total_data_rows progress is reported as position() (bytes consumed,
+    by default of f itself) against file_size. Returns the task result, which
+    like the completed state carries per-stage timings and, when profile is
+    "cprofile" or "pyinstrument", the path of the captured profile.
+    checkpoint defaults to an ImportCheckpoint for task_id."""
+    line_reader = _CountingLineReader(f)
+    if position is None:
+        position = lambda: line_reader.bytes_read
+    
+    def report_progress(rows_processed, unique_count, saved_count, batch_size):
+        if total_data_rows:
+            progress = 5 + (rows_processed / total_data_rows) * 85
+            message = f"Processing: {rows_processed}/{total_data_rows} rows ({unique_count} unique, {saved_count} saved, batch size {batch_size})"
+        else:
+            progress = 5 + (min(position() / file_size, 1.0) * 85 if file_size else 0)
+            message = f"Processing: {rows_processed} rows read ({unique_count} unique, {saved_count} saved, batch size {batch_size})"
+        reporter.update("importing", progress, message, total_data_rows, rows_processed)
+    
+    def publish(*args):
+        with timer.stage("redis_publish"):
+            publish_progress(task_id, *args)
+    
+    timer = StageTimer()
+    checkpoint = checkpoint or ImportCheckpoint(task_id)
+    sku_counter = _UniqueSkuCounter(task_id)
+    reporter = ProgressReporter(publish)
+    try:
+        with capture_profile(profile, task_id) as profile_info:
+            if IMPORT_PARSER == "arrow":
+                rows_processed, unique_products_saved, batch_sizes, changes = _import_arrow(db, line_reader, report_progress, sku_counter, checkpoint, timer)
+            else:
+                reader = _csv_dict_reader(line_reader)
+                rows_processed, unique_products_saved, batch_sizes, changes = _import_rows(db, reader, report_progress, sku_counter, line_reader, checkpoint, timer)
+    finally:
+        reporter.close()
+    
+    if not total_data_rows:
+        total_data_rows = rows_processed
+    
+    stats = {"stages": timer.summary(), **profile_info}
+    if rows_processed == 0:
+        publish_progress(task_id, "completed", 100, "No valid rows to import", 0, 0, extra=stats)
+    else:
+        publish_progress(task_id, "completed", 100, 
+                       f"Successfully imported {unique_products_saved} unique products from {rows_processed} total rows ({_describe_changes(changes)})",
+                       total_data_rows, rows_processed, extra={**changes, **stats})
+    
+    checkpoint.clear()
+    _clear_import_batches(db, checkpoint.task_id)
+    sku_counter.clear()
+    return {
+        "status": "success",
+        "total_csv_rows": total_data_rows,
+        "unique_products": unique_products_saved,
+        **changes,
+        "batch_sizes": batch_sizes,
+        **stats,
+    }
+
+@celery_app.task(bind=True)
+def import_csv_task(self, file_path: str, file_size: int = 0, profile: str = None):
+    task_id = self.request.id
+    db = SessionLocal()
+    
+    try:
+        if not file_size:
+            file_size = os.path.getsize(file_path)
+        
+        if IMPORT_SHARDS > 1 and file_size >= IMPORT_SHARD_MIN_BYTES:
+            return _fan_out_import(task_id, file_path, IMPORT_SHARDS, profile or IMPORT_PROFILE)
+        
+        # In single-pass mode the row total is only known once the file is read,
+        # so progress is reported by bytes consumed against file_size instead.
+        total_data_rows = 0
+        if IMPORT_SINGLE_PASS:
+            publish_progress(task_id, "importing", 0, "Starting import...")
+        else:
+            publish_progress(task_id, "counting", 0, "Counting CSV rows...")
             
-            if current_batch:
-                batch_data = list(current_batch.values())
-                result = _bulk_upsert_products(db, batch_data)
-                
-                for product_id, event_type in result:
-                    trigger_webhooks.delay(product_id, event_type)
-                
-                unique_products_saved += len(batch_data)
+            total_data_rows = _count_csv_rows(file_path)
+            
+            if total_data_rows == 0:
+                publish_progress(task_id, "completed", 100, "No valid rows to import", 0, 0)
+                return {"status": "success", "total_csv_rows": 0, "unique_products": 0}
             
-            publish_progress(task_id, "completed", 100, 
-                           f"Successfully imported {unique_products_saved} unique products from {rows_processed} total rows",
-                           total_data_rows, rows_processed)
+            publish_progress(task_id, "importing", 5, f"Found {total_data_rows} rows to import", total_data_rows, 0)
+        
+        with open_upload(file_path) as (f, position):
+            result = _import_file_object(db, task_id, f, file_size, total_data_rows, position, profile or IMPORT_PROFILE)
         
         try:
             os.remove(file_path)
         except Exception as e:
             logger.warning(f"Failed to remove temp file: {e}")
         
-        return {"status": "success", "total_csv_rows": total_data_rows, "unique_products": unique_products_saved}
+        return result
+    
+    except Exception as e:
+        error_msg = f"Import failed: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        publish_progress(task_id, "failed", 0, error_msg)
+        db.rollback()
+        raise
+    
+    finally:
+        db.close()
+
+@celery_app.task(bind=True)
+def import_stream_task(self, stream_key: str, file_size: int = 0, profile: str = None):
+    """Imports an upload that the API is still appending to a Redis stream,
+    so batches are upserted while later bytes are in flight. Stream imports
+    always run as a single task."""
+    task_id = self.request.id
+    db = SessionLocal()
+    
+    try:
+        publish_progress(task_id, "importing", 0, "Starting import...")
+        
+        stream = RedisStreamReader(redis_client, stream_key)
+        with io.BufferedReader(stream) as f:
+            result = _import_file_object(db, task_id, f, file_size, profile=profile or IMPORT_PROFILE,
+                                         checkpoint=_StreamCheckpoint(task_id, stream))
+        
+        redis_client.delete(stream_key)
+        
+        return result
+    
+    except Exception as e:
+        error_msg = f"Import failed: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        publish_progress(task_id, "failed", 0, error_msg)
+        db.rollback()
+        raise
+    
+    finally:
+        db.close()
+
+@celery_app.task(bind=True)
+def import_csv_shard_task(self, parent_task_id: str, shard_path: str, total_data_rows: int, profile: str = None):
+    """Imports one SKU-hash shard with the configured IMPORT_PARSER, profiled
+    as {parent_task_id}-{shard} when profile is set. Each shard records its
+    own counts in the import_shards:{parent_task_id} hash and the sum is
+    published on the parent's channel, so a redelivered shard doesn't double
+    count.
+    
+    A failing shard records its error in the same hash instead of publishing
+    it; the other shards stop at their next progress update and
+    fail_sharded_import publishes the failure once the chord has finished.
+    """
+    db = SessionLocal()
+    progress_key = f"import_shards:{parent_task_id}"
+    shard_name = shard_path.rsplit('.', 1)[-1]
+    aborted = threading.Event()
+    
+    def publish_shard_progress(rows_processed, unique_count, saved_count, batch_size):
+        pipe = redis_client.pipeline()
+        pipe.hset(progress_key, mapping={f"{shard_name}:rows": rows_processed, f"{shard_name}:saved": saved_count})
+        pipe.expire(progress_key, 3600)
+        pipe.hgetall(progress_key)
+        counts = pipe.execute()[-1]
+        
+        if b"failed" in counts:
+            aborted.set()
+            return
+        
+        combined_rows = sum(int(v) for k, v in counts.items() if k.endswith(b":rows"))
+        combined_saved = sum(int(v) for k, v in counts.items() if k.endswith(b":saved"))
+        progress = 5 + min(combined_rows / total_data_rows, 1.0) * 85
+        publish_progress(parent_task_id, "importing", progress,
+                       f"Processing: {combined_rows}/{total_data_rows} rows across shards ({unique_count} unique, {combined_saved} saved, batch size {batch_size} in {shard_name})",
+                       total_data_rows, combined_rows)
+    
+    def publish(*args):
+        with timer.stage("redis_publish"):
+            publish_shard_progress(*args)
+    
+    timer = StageTimer()
+    reporter = ProgressReporter(publish)
+    
+    def report_progress(rows_processed, unique_count, saved_count, batch_size):
+        reporter.update(rows_processed, unique_count, saved_count, batch_size)
+        if aborted.is_set():
+            raise _ShardAborted(f"{shard_name} stopped after another shard failed")
+    
+    try:
+        checkpoint = ImportCheckpoint(self.request.id)
+        sku_counter = _UniqueSkuCounter(parent_task_id)
+        with open(shard_path, 'rb') as f, capture_profile(profile, f"{parent_task_id}-{shard_name}") as profile_info:
+            line_reader = _CountingLineReader(f)
+            try:
+                if IMPORT_PARSER == "arrow":
+                    rows_processed, unique_products_saved, batch_sizes, changes = _import_arrow(
+                        db, line_reader, report_progress, sku_counter, checkpoint, timer
+                    )
+                else:
+                    rows_processed, unique_products_saved, batch_sizes, changes = _import_rows(
+                        db, _csv_dict_reader(line_reader), report_progress, sku_counter, line_reader, checkpoint, timer
+                    )
+            finally:
+                reporter.close()
+        
+        checkpoint.clear()
+        _clear_import_batches(db, checkpoint.task_id)
+        _remove_files([shard_path])
+        
+        return {
+            "rows": rows_processed,
+            "unique_products": unique_products_saved,
+            **changes,
+            "batch_sizes": batch_sizes,
+            "stages": timer.summary(),
+            **profile_info,
+        }
+    
+    except _ShardAborted:
+        db.rollback()
+        raise
     
     except Exception as e:
         error_msg = f"Import failed: {str(e)}"
         logger.error(error_msg, exc_info=True)
+        redis_client.hsetnx(progress_key, "failed", error_msg)
+        db.rollback()
+        raise
+    
+    finally:
+        db.close()
+
+@celery_app.task
+def finalize_sharded_import(shard_results, task_id: str, file_path: str, total_data_rows: int):
+    rows_processed = sum(r["rows"] for r in shard_results)
+    unique_products_saved = sum(r["unique_products"] for r in shard_results)
+    changes = {key: sum(r.get(key, 0) for r in shard_results) for key in ("created", "updated", "unchanged")}
+    stats = {"stages": merge_stage_summaries(r.get("stages") for r in shard_results)}
+    profiles = [r["profile"] for r in shard_results if r.get("profile")]
+    if profiles:
+        stats["profiles"] = profiles
+    
+    publish_progress(task_id, "completed", 100,
+                   f"Successfully imported {unique_products_saved} unique products from {rows_processed} total rows ({_describe_changes(changes)}, {len(shard_results)} shards)",
+                   total_data_rows, rows_processed, extra={**changes, **stats})
+    
+    redis_client.delete(f"import_shards:{task_id}")
+    _UniqueSkuCounter(task_id).clear()
+    ImportCheckpoint(task_id).clear()
+    _remove_files([file_path])
+    
+    return {
+        "status": "success",
+        "total_csv_rows": total_data_rows,
+        "unique_products": unique_products_saved,
+        **changes,
+        "shards": len(shard_results),
+        "batch_sizes": [r.get("batch_sizes") for r in shard_results],
+        **stats,
+    }
+
+@celery_app.task
+def fail_sharded_import(request, exc, traceback, task_id: str, file_path: str, shard_paths: List[str]):
+    """Error callback of the shard chord, called once every shard has
+    returned if any of them failed (or finalize_sharded_import did).
+    Publishes the first shard error as the terminal state, after the last
+    shard progress update, and removes the upload and leftover shards."""
+    progress_key = f"import_shards:{task_id}"
+    error = redis_client.hget(progress_key, "failed")
+    error_msg = error.decode() if error else f"Import failed: {exc}"
+    
+    redis_client.delete(progress_key)
+    _UniqueSkuCounter(task_id).clear()
+    ImportCheckpoint(task_id).clear()
+    _remove_files([path for path in shard_paths + [file_path] if os.path.exists(path)])
+    
+    publish_progress(task_id, "failed", 0, error_msg)
+
+@celery_app.task(bind=True)
+def bulk_delete_products_task(self):
+    """Deletes every product without loading them into the web process.
+    
+    With no product.deleted subscribers the table is truncated outright.
+    Otherwise rows up to the current max id are removed in chunks of
+    BULK_DELETE_CHUNK_SIZE with DELETE ... RETURNING, and each chunk's
+    returned rows are written to the outbox as product.deleted events in the
+    chunk's transaction.
+    """
+    task_id = self.request.id
+    db = SessionLocal()
+    
+    try:
+        publish_progress(task_id, "deleting", 0, "Deleting products...")
+        
+        has_subscribers = bool(get_webhook_subscriptions(db, ["product.deleted"]))
+        
+        if not has_subscribers:
+            total = db.query(func.count(Product.id)).scalar()
+            if db.get_bind().dialect.name == "postgresql":
+                db.execute(text("TRUNCATE products"))
+            else:
+                db.query(Product).delete()
+            db.commit()
+            bump_products_generation()
+            invalidate_all_products()
+            
+            publish_progress(task_id, "completed", 100, f"Deleted {total} products successfully", total, total)
+            return {"status": "success", "count": total}
+        
+        # Rows imported while the delete runs are left alone
+        max_id = db.query(func.max(Product.id)).scalar() or 0
+        total = db.query(func.count(Product.id)).filter(Product.id <= max_id).scalar()
+        deleted = 0
+        reporter = ProgressReporter(lambda *args: publish_progress(task_id, *args))
+        
+        try:
+            while True:
+                chunk_ids = select(Product.id).where(Product.id <= max_id).order_by(Product.id).limit(BULK_DELETE_CHUNK_SIZE)
+                rows = db.execute(
+                    delete(Product)
+                    .where(Product.id.in_(chunk_ids))
+                    .returning(Product.id, Product.sku, Product.name, Product.description, Product.active)
+                ).all()
+                add_outbox_events(db, [("product.deleted", dict(row._mapping)) for row in rows])
+                db.commit()
+                
+                if not rows:
+                    break
+                
+                deleted += len(rows)
+                invalidate_products([row.id for row in rows])
+                schedule_outbox_relay()
+                
+                progress = min(deleted / total, 1.0) * 100 if total else 100
+                reporter.update("deleting", progress, f"Deleted {deleted}/{total} products", total, deleted)
+        finally:
+            reporter.close()
+        
+        bump_products_generation()
+        publish_progress(task_id, "completed", 100, f"Deleted {deleted} products successfully", total, deleted)
+        
+        return {"status": "success", "count": deleted}
+    
+    except Exception as e:
+        error_msg = f"Bulk delete failed: {str(e)}"
+        logger.error(error_msg, exc_info=True)
         publish_progress(task_id, "failed", 0, error_msg)
         db.rollback()
         raise
@@ -158,12 +1032,18 @@ def import_csv_task(self, file_path: str, file_size: int = 0):
     finally:
         db.close()
 
-def _bulk_upsert_products(db, products_data):
+def _bulk_upsert_products(db, products_data, timer=None, batch_key=None):
+    """ORM engine. Returns (id, event) for every created or updated product
+    and writes the same events to the outbox before committing, unless
+    batch_key shows the batch already committed; with IMPORT_SKIP_UNCHANGED
+    products whose fields already match are left out and not written."""
+    timer = timer or StageTimer()
     product_ids_and_events = []
     
     existing_skus = {}
     sku_list = [p['sku'].lower() for p in products_data]
-    existing_products = db.query(Product).filter(func.lower(Product.sku).in_(sku_list)).all()
+    with timer.stage("select_existing"):
+        existing_products = db.query(Product).filter(func.lower(Product.sku).in_(sku_list)).all()
     
     for p in existing_products:
         existing_skus[p.sku.lower()] = p
@@ -176,6 +1056,8 @@ def _bulk_upsert_products(db, products_data):
         
         if sku_lower in existing_skus:
             existing = existing_skus[sku_lower]
+            if IMPORT_SKIP_UNCHANGED and existing.name == product_dict['name'] and existing.description == product_dict['description']:
+                continue
             existing.name = product_dict['name']
             existing.description = product_dict['description']
             products_to_update.append(existing)
@@ -184,49 +1066,326 @@ def _bulk_upsert_products(db, products_data):
             new_product = Product(**product_dict)
             products_to_add.append(new_product)
     
-    if products_to_add:
-        db.add_all(products_to_add)
-        db.flush()
-        for p in products_to_add:
-            product_ids_and_events.append((p.id, "product.created"))
+    with timer.stage("flush"):
+        if products_to_add:
+            db.add_all(products_to_add)
+            db.flush()
+            for p in products_to_add:
+                product_ids_and_events.append((p.id, "product.created"))
     
-    db.commit()
+    with timer.stage("outbox"):
+        events = [("product.updated", product_payload(p)) for p in products_to_update]
+        events += [("product.created", product_payload(p)) for p in products_to_add]
+        if _claim_import_batch(db, batch_key):
+            add_outbox_events(db, events)
+    
+    with timer.stage("commit"):
+        db.commit()
     return product_ids_and_events
 
+def _claim_import_batch(db, batch_key):
+    """Adds batch_key, an (import id, batch number) pair, to the
+    import_batches ledger in db's current transaction. False if it is already
+    there: the batch committed before and is being replayed after a crash
+    between that commit and its checkpoint, so its events are already in the
+    outbox. Without IMPORT_SKIP_UNCHANGED the replay would emit them again."""
+    if batch_key is None:
+        return True
+    if db.get(ImportBatch, batch_key) is not None:
+        logger.info(f"Batch {batch_key[1]} of import {batch_key[0]} already committed, not adding its events again")
+        return False
+    db.add(ImportBatch(import_id=batch_key[0], batch=batch_key[1]))
+    return True
+
+def _clear_import_batches(db, import_id):
+    """Drops a finished import's ledger rows, and any left by imports that
+    failed more than IMPORT_CHECKPOINT_TTL ago and can no longer resume."""
+    expired = datetime.utcnow() - timedelta(seconds=IMPORT_CHECKPOINT_TTL)
+    db.execute(delete(ImportBatch).where((ImportBatch.import_id == import_id) | (ImportBatch.created_at < expired)))
+    db.commit()
+
+def _resolve_import_engine(db):
+    if IMPORT_ENGINE in ("copy", "orm"):
+        return IMPORT_ENGINE
+    return "copy" if db.get_bind().dialect.name == "postgresql" else "orm"
+
+def _copy_csv_field(value):
+    # Unquoted empty is NULL in COPY's CSV format; quoting every other value
+    # keeps empty strings and a literal "\." line from being misread.
+    if value is None:
+        return ""
+    return '"' + value.replace('"', '""') + '"'
+
+def _build_copy_buffer(products_data):
+    buf = io.StringIO()
+    for p in products_data:
+        buf.write(",".join((
+            _copy_csv_field(p['sku']),
+            _copy_csv_field(p['name']),
+            _copy_csv_field(p['description']),
+        )))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+def _copy_upsert_products(db, products_data, timer=None, batch_key=None):
+    """PostgreSQL engine: COPY the batch into a temp staging table and merge it
+    into products with a single INSERT ... ON CONFLICT. Batches must already be
+    deduplicated by lower(sku), as ON CONFLICT cannot touch the same row twice.
+    With IMPORT_SKIP_UNCHANGED the merge skips rows whose fields already match,
+    so they are neither rewritten nor returned. Returned rows become outbox
+    events in the same transaction, as in _bulk_upsert_products."""
+    timer = timer or StageTimer()
+    
+    raw_conn = db.connection().connection
+    cursor = raw_conn.cursor()
+    try:
+        with timer.stage("copy"):
+            buf = _build_copy_buffer(products_data)
+            cursor.execute(COPY_STAGING_DDL)
+            cursor.copy_expert(COPY_STAGING_SQL, buf)
+        with timer.stage("merge"):
+            cursor.execute(COPY_MERGE_SQL.format(change_filter=COPY_MERGE_CHANGED_FILTER if IMPORT_SKIP_UNCHANGED else ""))
+            rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    
+    events = [
+        ("product.created" if inserted else "product.updated",
+         {"id": product_id, "sku": sku, "name": name, "description": description, "active": active})
+        for product_id, inserted, sku, name, description, active in rows
+    ]
+    with timer.stage("outbox"):
+        if _claim_import_batch(db, batch_key):
+            add_outbox_events(db, events)
+    
+    with timer.stage("commit"):
+        db.commit()
+    return [(payload["id"], event_type) for event_type, payload in events]
+
+WEBHOOK_STATS_FIELDS = ("delivered", "failed", "retried", "short_circuited", "latency_count")
+
+def _deliver_and_record(deliveries, timer=None):
+    if not deliveries:
+        return []
+    
+    timer = timer or StageTimer()
+    with timer.stage("deliver"):
+        results, stats = deliver_webhooks(deliveries)
+    
+    with timer.stage("record_stats"):
+        _record_webhook_stats(stats)
+    
+    return results
+
+def _record_webhook_stats(stats):
+    try:
+        pipe = redis_client.pipeline()
+        for webhook_id, counters in stats.items():
+            key = f"webhook_stats:{webhook_id}"
+            for field in WEBHOOK_STATS_FIELDS:
+                if counters[field]:
+                    pipe.hincrby(key, field, counters[field])
+            pipe.hincrbyfloat(key, "latency_ms_sum", counters["latency_ms_sum"])
+            if counters["last_error"]:
+                pipe.hset(key, "last_error", counters["last_error"])
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Failed to record webhook stats: {e}")
+
+def get_webhook_stats(webhook_id: int):
+    raw = {k.decode(): v.decode() for k, v in redis_client.hgetall(f"webhook_stats:{webhook_id}").items()}
+    
+    stats = {field: int(raw.get(field, 0)) for field in WEBHOOK_STATS_FIELDS}
+    latency_ms_sum = float(raw.get("latency_ms_sum", 0))
+    stats["avg_latency_ms"] = round(latency_ms_sum / stats["latency_count"], 2) if stats["latency_count"] else None
+    stats["last_error"] = raw.get("last_error")
+    return stats
+
+def product_payload(product):
+    return {
+        "id": product.id,
+        "sku": product.sku,
+        "name": product.name,
+        "description": product.description,
+        "active": product.active,
+    }
+
+def _plan_deliveries(events, webhooks_by_event, targets=None):
+    """[((webhook id, url, body), event indexes)] for every subscriber of each
+    (event_type, payload) in events, in event order. Envelope mode sends each
+    run of consecutive same-type events as one {"event", "products"} body.
+    targets optionally limits event i to the webhook ids in targets[i]."""
+    planned = []
+    
+    def wanted(index, webhook):
+        return targets is None or webhook["id"] in targets[index]
+    
+    if WEBHOOK_DELIVERY_MODE == "envelope":
+        for event_type, run in itertools.groupby(enumerate(events), key=lambda item: item[1][0]):
+            run = list(run)
+            for webhook in webhooks_by_event.get(event_type, []):
+                indexes = [index for index, _ in run if wanted(index, webhook)]
+                if indexes:
+                    body = {"event": event_type, "products": [events[index][1] for index in indexes]}
+                    planned.append(((webhook["id"], webhook["url"], body), indexes))
+    else:
+        for index, (event_type, payload) in enumerate(events):
+            body = {"event": event_type, "product": payload}
+            planned.extend(
+                ((webhook["id"], webhook["url"], body), [index])
+                for webhook in webhooks_by_event.get(event_type, [])
+                if wanted(index, webhook)
+            )
+    
+    return planned
+
+def add_outbox_events(db, events, subscribed=None):
+    """Adds (event_type, product payload) pairs to db's current transaction as
+    outbox rows, so they commit or roll back with the change itself. Event
+    types nobody subscribes to are dropped; subscribed, if given, is their
+    get_webhook_subscriptions result. Returns the number written."""
+    if not events:
+        return 0
+    
+    if subscribed is None:
+        subscribed = get_webhook_subscriptions(db, {event_type for event_type, _ in events})
+    rows = [
+        {"event_type": event_type, "product_id": payload["id"], "payload": payload}
+        for event_type, payload in events
+        if event_type in subscribed
+    ]
+    if rows:
+        db.execute(insert(OutboxEvent), rows)
+    return len(rows)
+
+def schedule_outbox_relay():
+    """Call after committing outbox events. Queues a relay run
+    OUTBOX_RELAY_DELAY seconds out unless one is already pending; if Redis or
+    the broker is down the periodic relay picks the events up instead."""
+    try:
+        if redis_client.set(OUTBOX_RELAY_PENDING_KEY, 1, nx=True, ex=int(OUTBOX_RELAY_DELAY) + 60):
+            relay_outbox_events.apply_async(countdown=OUTBOX_RELAY_DELAY)
+    except Exception as e:
+        logger.warning(f"Failed to schedule outbox relay: {e}")
+
+@contextmanager
+def _outbox_relay_lock(db):
+    """Yields whether this relay holds the outbox lock, a session-level
+    advisory lock on its own connection so that it spans the relay's commits.
+    Only PostgreSQL is shared between workers; other databases always get it."""
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        yield True
+        return
+    
+    with bind.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": OUTBOX_RELAY_LOCK_KEY}).scalar()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": OUTBOX_RELAY_LOCK_KEY})
+
 @celery_app.task
-def trigger_webhooks(product_id: int, event_type: str):
+def relay_outbox_events():
+    """Drains outbox_events into webhook delivery, oldest first.
+    
+    Runs one at a time under an advisory lock and sends the events it can
+    see in id order. An event whose transaction commits after the run has
+    read past its id goes out with the next run, behind later events.
+    
+    Each batch of up to OUTBOX_BATCH_SIZE rows is read and the read
+    transaction committed before any HTTP request is made; delivered events
+    are then deleted, and failed ones keep the webhooks still owed them for
+    the next run. Once a webhook fails, its later events in this run
+    are held back rather than sent ahead of the failed one. Also runs
+    periodically from celery beat.
+    
+    Returns the number of events relayed and the time spent in each stage.
+    """
+    redis_client.delete(OUTBOX_RELAY_PENDING_KEY)  # events committed from here on schedule another run
     db = SessionLocal()
+    timer = StageTimer()
+    relayed = 0
     
     try:
-        webhooks = db.query(Webhook).filter(
-            Webhook.enabled == True,
-            Webhook.event_type == event_type
-        ).all()
-        
-        if not webhooks:
-            return
-        
-        product = db.query(Product).filter(Product.id == product_id).first()
-        if not product:
-            return
-        
-        payload = {
-            "event": event_type,
-            "product": {
-                "id": product.id,
-                "sku": product.sku,
-                "name": product.name,
-                "description": product.description,
-                "active": product.active,
-            }
-        }
+        with _outbox_relay_lock(db) as acquired:
+            if not acquired:
+                # The running relay may already be past newer events
+                schedule_outbox_relay()
+                return {"relayed": 0, "stages": {}}
+            
+            last_id = 0
+            blocked = set()
+            while True:
+                with timer.stage("load_events"):
+                    rows = db.execute(
+                        select(OutboxEvent.id, OutboxEvent.event_type, OutboxEvent.payload,
+                               OutboxEvent.attempts, OutboxEvent.webhook_ids)
+                        .where(OutboxEvent.id > last_id, OutboxEvent.attempts < OUTBOX_MAX_ATTEMPTS)
+                        .order_by(OutboxEvent.id)
+                        .limit(OUTBOX_BATCH_SIZE)
+                    ).all()
+                
+                if not rows:
+                    break
+                
+                last_id = rows[-1].id
+                events = [(row.event_type, row.payload) for row in rows]
+                with timer.stage("load_subscriptions"):
+                    webhooks_by_event = get_webhook_subscriptions(db, {event_type for event_type, _ in events})
+                    db.commit()
+                
+                # Webhooks still owed each event; ones unsubscribed since are dropped
+                owed = []
+                for row in rows:
+                    subscribed = {webhook["id"] for webhook in webhooks_by_event.get(row.event_type, [])}
+                    owed.append(subscribed if row.webhook_ids is None else subscribed & set(row.webhook_ids))
+                
+                planned = _plan_deliveries(events, webhooks_by_event, [ids - blocked for ids in owed])
+                results = _deliver_and_record([delivery for delivery, _ in planned], timer)
+                
+                failed = [False] * len(rows)
+                for (delivery, indexes), delivered in zip(planned, results):
+                    if delivered:
+                        for index in indexes:
+                            owed[index].discard(delivery[0])
+                    else:
+                        blocked.add(delivery[0])
+                        for index in indexes:
+                            failed[index] = True
+                
+                done = [row.id for row, ids in zip(rows, owed) if not ids]
+                retries = {}
+                for row, ids, attempted in zip(rows, owed, failed):
+                    if ids:
+                        retries.setdefault((tuple(sorted(ids)), attempted), []).append(row.id)
+                        if attempted and row.attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+                            logger.warning(f"Outbox event {row.id} failed {row.attempts + 1} times, leaving it undelivered")
+                
+                with timer.stage("update_outbox"):
+                    if done:
+                        db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(done)))
+                    for (ids, attempted), event_ids in retries.items():
+                        db.execute(
+                            update(OutboxEvent)
+                            .where(OutboxEvent.id.in_(event_ids))
+                            .values(webhook_ids=list(ids), attempts=OutboxEvent.attempts + int(attempted))
+                            .execution_options(synchronize_session=False)
+                        )
+                    db.commit()
+                relayed += len(done)
         
-        for webhook in webhooks:
-            try:
-                with httpx.Client(timeout=10.0) as client:
-                    client.post(webhook.url, json=payload)
-            except:
-                pass
+        stages = timer.summary()
+        if relayed:
+            logger.info(f"Relayed {relayed} outbox events: " + ", ".join(f"{name} {stage['total_ms']}ms" for name, stage in stages.items()))
+        return {"relayed": relayed, "stages": stages}
+    
+    except Exception:
+        db.rollback()
+        raise
     
     finally:
         db.close()
@@ -0,0 +1,179 @@
+import csv
+import io
+import os
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Streamed uploads are forwarded through a Redis stream instead of a file
+# under uploads/, so the web and worker processes need not share a disk
+UPLOAD_STREAM_CHUNK_SIZE = int(os.getenv("UPLOAD_STREAM_CHUNK_SIZE", str(256 * 1024)))
+UPLOAD_STREAM_TTL = int(os.getenv("UPLOAD_STREAM_TTL", "3600"))
+UPLOAD_STREAM_IDLE_TIMEOUT = float(os.getenv("UPLOAD_STREAM_IDLE_TIMEOUT", "60"))
+
+def upload_stream_key(upload_id: str):
+    return f"upload:{upload_id}"
+
+async def read_csv_header(chunks):
+    """Pulls chunks from an async iterator until the header line is complete
+    and checks it for the required columns. Returns the bytes read so far,
+    which still have to be forwarded."""
+    buffered = b""
+    
+    while b"\n" not in buffered:
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            break
+        buffered += chunk
+    
+    header_line = buffered.split(b"\n", 1)[0].decode("utf-8-sig", errors="replace")
+    fieldnames = next(csv.reader([header_line]), [])
+    
+    if "sku" not in fieldnames or "name" not in fieldnames:
+        raise ValueError("CSV must contain 'sku' and 'name' columns")
+    
+    return buffered
+
+async def forward_upload(redis, key: str, head: bytes, chunks):
+    """XADDs the upload to the stream in UPLOAD_STREAM_CHUNK_SIZE pieces as it
+    arrives, ending with an eof entry (or an error entry if the client goes away).
+    
+    head (the bytes read_csv_header checked) goes in an entry of its own, so
+    the first entry always holds the whole CSV header. Each data entry
+    carries the byte offset it starts at, which lets the worker trim the
+    entries between the header and its checkpoint while it reads.
+    """
+    pending = b""
+    offset = len(head)
+    
+    try:
+        await redis.xadd(key, {"data": head, "offset": 0})
+        async for chunk in chunks:
+            pending += chunk
+            while len(pending) >= UPLOAD_STREAM_CHUNK_SIZE:
+                await redis.xadd(key, {"data": pending[:UPLOAD_STREAM_CHUNK_SIZE], "offset": offset})
+                pending = pending[UPLOAD_STREAM_CHUNK_SIZE:]
+                offset += UPLOAD_STREAM_CHUNK_SIZE
+        
+        if pending:
+            await redis.xadd(key, {"data": pending, "offset": offset})
+        await redis.xadd(key, {"eof": "1"})
+    except Exception as e:
+        await redis.xadd(key, {"error": f"{type(e).__name__}: {e}"})
+        raise
+    finally:
+        await redis.expire(key, UPLOAD_STREAM_TTL)
+
+class RedisStreamReader(io.RawIOBase):
+    """Blocking, read-only file object over an upload stream for the worker.
+    
+    Wrap it in io.BufferedReader to iterate lines. Entries are consumed with
+    XREAD from the start of the stream, so reading can begin while the API is
+    still appending. An error entry, or no new data for idle_timeout seconds,
+    raises IOError.
+    
+    Positions are byte offsets into the upload. trim() deletes the entries a
+    checkpoint has made unnecessary except the header entry, and seek() can
+    skip forward over the gap they leave, so a resumed import reads the
+    header and then continues at its checkpoint.
+    """
+    
+    def __init__(self, redis_client, key: str, idle_timeout: float = UPLOAD_STREAM_IDLE_TIMEOUT):
+        self._redis = redis_client
+        self._key = key
+        self._idle_timeout = idle_timeout
+        self._last_id = "0"
+        self._buffer = b""
+        self._buffer_start = 0
+        self._pos = 0
+        self._eof = False
+        self._entries = deque()  # (entry id, start offset) of the data entries read and not trimmed
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def tell(self):
+        return self._buffer_start + self._pos
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Forward only: reads ahead to offset."""
+        if whence == io.SEEK_CUR:
+            offset += self.tell()
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("upload streams can't seek from the end")
+        if offset < self.tell():
+            raise io.UnsupportedOperation(f"can't seek back to {offset} in upload stream {self._key}")
+        
+        while self._buffer_start + len(self._buffer) < offset and not self._eof:
+            self._fetch(allow_gap=True)
+        if offset < self._buffer_start:
+            raise IOError(f"Upload stream {self._key} was trimmed past offset {offset}")
+        self._pos = min(offset - self._buffer_start, len(self._buffer))
+        return self.tell()
+    
+    def trim(self, offset: int):
+        """Deletes the entries after the header entry that end at or before
+        offset, once a checkpoint at offset means they are never re-read."""
+        stale = []
+        while len(self._entries) > 2 and self._entries[2][1] <= offset:
+            stale.append(self._entries[1][0])
+            del self._entries[1]
+        
+        if stale:
+            self._redis.xdel(self._key, *stale)
+    
+    def readinto(self, b):
+        while self._pos >= len(self._buffer) and not self._eof:
+            self._fetch()
+        
+        n = min(len(b), len(self._buffer) - self._pos)
+        b[:n] = self._buffer[self._pos:self._pos + n]
+        self._pos += n
+        return n
+    
+    def _fetch(self, allow_gap=False):
+        """Replaces the buffer with the next contiguous run of data entries."""
+        deadline = time.monotonic() + self._idle_timeout
+        
+        while True:
+            response = self._redis.xread({self._key: self._last_id}, count=100, block=1000)
+            if response:
+                break
+            if time.monotonic() >= deadline:
+                raise IOError(f"Upload stream {self._key} received no data for {self._idle_timeout}s")
+        
+        end = self._buffer_start + len(self._buffer)
+        start = None
+        chunks = []
+        for entry_id, fields in response[0][1]:
+            if b"data" in fields:
+                entry_start = int(fields.get(b"offset", end))
+                if entry_start != end:
+                    if chunks:
+                        break  # left for the next fetch
+                    if not allow_gap:
+                        raise IOError(f"Upload stream {self._key} is missing bytes {end}-{entry_start}")
+                start = entry_start if start is None else start
+                self._entries.append((entry_id, entry_start))
+                chunks.append(fields[b"data"])
+                end = entry_start + len(fields[b"data"])
+            elif b"error" in fields:
+                raise IOError(f"Upload aborted: {fields[b'error'].decode()}")
+            else:
+                self._eof = True
+            self._last_id = entry_id
+        
+        if chunks:
+            self._buffer = b"".join(chunks)
+            self._buffer_start = start
+            self._pos = 0
+        else:
+            self._buffer_start += len(self._buffer)
+            self._buffer = b""
+            self._pos = 0
@@ -0,0 +1,218 @@
+import asyncio
+import os
+import random
+import time
+import logging
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "100"))
+WEBHOOK_MAX_PER_ENDPOINT = int(os.getenv("WEBHOOK_MAX_PER_ENDPOINT", "8"))
+WEBHOOK_MAX_RETRIES = int(os.getenv("WEBHOOK_MAX_RETRIES", "3"))
+WEBHOOK_BACKOFF_BASE = float(os.getenv("WEBHOOK_BACKOFF_BASE", "0.5"))
+WEBHOOK_BACKOFF_MAX = float(os.getenv("WEBHOOK_BACKOFF_MAX", "30"))
+WEBHOOK_BREAKER_THRESHOLD = int(os.getenv("WEBHOOK_BREAKER_THRESHOLD", "5"))
+WEBHOOK_BREAKER_RESET = float(os.getenv("WEBHOOK_BREAKER_RESET", "30"))
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures and then lets a
+    single probe request through every reset_timeout seconds until one succeeds."""
+    
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+    
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+    
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.opened_at = time.monotonic()
+            return True
+        return False
+    
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+class WebhookStats:
+    def __init__(self):
+        self.delivered = 0
+        self.failed = 0
+        self.retried = 0
+        self.short_circuited = 0
+        self.latency_ms_sum = 0.0
+        self.latency_count = 0
+        self.last_error = None
+    
+    def to_dict(self):
+        return {
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retried": self.retried,
+            "short_circuited": self.short_circuited,
+            "latency_ms_sum": round(self.latency_ms_sum, 3),
+            "latency_count": self.latency_count,
+            "last_error": self.last_error,
+        }
+
+class WebhookDeliveryEngine:
+    """Delivers webhook posts over one long-lived httpx.AsyncClient.
+    
+    Concurrency is capped per endpoint (scheme://host:port), failed attempts
+    are retried with exponential backoff and full jitter, and a circuit
+    breaker per endpoint skips deliveries to endpoints that keep failing.
+    Per-webhook counters accumulate in self.stats until pop_stats() is called.
+    """
+    
+    def __init__(
+        self,
+        timeout: float = WEBHOOK_TIMEOUT,
+        max_connections: int = WEBHOOK_MAX_CONNECTIONS,
+        max_per_endpoint: int = WEBHOOK_MAX_PER_ENDPOINT,
+        max_retries: int = WEBHOOK_MAX_RETRIES,
+        backoff_base: float = WEBHOOK_BACKOFF_BASE,
+        backoff_max: float = WEBHOOK_BACKOFF_MAX,
+        breaker_threshold: int = WEBHOOK_BREAKER_THRESHOLD,
+        breaker_reset: float = WEBHOOK_BREAKER_RESET,
+    ):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_per_endpoint = max_per_endpoint
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        
+        self._client = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.stats: Dict[int, WebhookStats] = {}
+    
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0,
+                ),
+            )
+        return self._client
+    
+    def _endpoint(self, url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+    
+    def _semaphore(self, endpoint):
+        if endpoint not in self._semaphores:
+            self._semaphores[endpoint] = asyncio.Semaphore(self.max_per_endpoint)
+        return self._semaphores[endpoint]
+    
+    def breaker(self, url):
+        endpoint = self._endpoint(url)
+        if endpoint not in self._breakers:
+            self._breakers[endpoint] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+        return self._breakers[endpoint]
+    
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+    
+    async def deliver(self, webhook_id: int, url: str, body: dict) -> bool:
+        stats = self.stats.setdefault(webhook_id, WebhookStats())
+        breaker = self.breaker(url)
+        client = self._get_client()
+        semaphore = self._semaphore(self._endpoint(url))
+        
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                stats.retried += 1
+                await asyncio.sleep(self._backoff(attempt))
+            
+            retryable = True
+            async with semaphore:
+                # Checked once a slot is free, so queued deliveries see a
+                # breaker that tripped while they were waiting
+                if not breaker.allow():
+                    stats.short_circuited += 1
+                    return False
+                
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json=body)
+                    if response.status_code < 400:
+                        error = None
+                    else:
+                        error = f"HTTP {response.status_code}"
+                        retryable = response.status_code == 429 or response.status_code >= 500
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    retryable = isinstance(e, httpx.TransportError)
+                stats.latency_ms_sum += (time.perf_counter() - start) * 1000
+                stats.latency_count += 1
+            
+            if error is None:
+                breaker.record_success()
+                stats.delivered += 1
+                return True
+            
+            stats.last_error = error
+            if not retryable:
+                break
+        
+        logger.warning(f"Webhook {webhook_id} delivery to {url} failed: {stats.last_error}")
+        breaker.record_failure()
+        stats.failed += 1
+        return False
+    
+    async def deliver_many(self, deliveries: List[Tuple[int, str, dict]]) -> List[bool]:
+        return await asyncio.gather(*(self.deliver(*delivery) for delivery in deliveries))
+    
+    def pop_stats(self):
+        stats = {webhook_id: s.to_dict() for webhook_id, s in self.stats.items()}
+        self.stats = {}
+        return stats
+    
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+# One engine and event loop per worker process, created lazily after the
+# prefork so that pooled connections and breaker state survive between tasks.
+_engine = None
+_loop = None
+
+def get_delivery_engine():
+    global _engine
+    if _engine is None:
+        _engine = WebhookDeliveryEngine()
+    return _engine
+
+def deliver_webhooks(deliveries: List[Tuple[int, str, dict]]):
+    """Sync entry point for Celery tasks. Returns (results, stats) where stats
+    holds the per-webhook counters accumulated by this call."""
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    
+    engine = get_delivery_engine()
+    results = _loop.run_until_complete(engine.deliver_many(deliveries))
+    return results, engine.pop_stats()
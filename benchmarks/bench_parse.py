@@ -0,0 +1,85 @@
+"""CSV parsing benchmark: csv.DictReader loop vs the pyarrow block parser.
+
+Generates a synthetic catalog CSV (with duplicate SKUs in mixed case and
+some invalid rows) and times only the parse + normalize + dedupe stage that
+feeds the upsert engines, so no database is needed:
+
+    python -m benchmarks.bench_parse --rows 500000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from app.arrow_parser import arrow_available, iter_normalized_batches
+from app.tasks import CHUNK_SIZE, _CountingLineReader, _csv_dict_reader
+from benchmarks.catalog import generate_catalog
+
+def _parse_dictreader(path):
+    """The per-row normalization done by tasks._import_rows, minus the upserts"""
+    rows = 0
+    current_batch = {}
+    with open(path, "rb") as f:
+        for row in _csv_dict_reader(_CountingLineReader(f)):
+            sku = row.get('sku', '').strip()
+            name = row.get('name', '').strip()
+            description = row.get('description', '').strip()
+            if not sku or not name:
+                continue
+            rows += 1
+            current_batch[sku.lower()] = {
+                'sku': sku,
+                'name': name,
+                'description': description if description else None,
+                'active': True
+            }
+            if len(current_batch) >= CHUNK_SIZE:
+                current_batch = {}
+    return rows
+
+def _parse_arrow(path):
+    rows = 0
+    with open(path, "rb") as f:
+        for _, valid_rows, _, _ in iter_normalized_batches(f):
+            rows += valid_rows
+    return rows
+
+def _time(fn, path, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = fn(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {"rows": rows, "seconds": round(best, 3), "rows_per_sec": int(rows / best)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="fraction of rows repeating an earlier SKU")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+    
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        generate_catalog(path, args.rows, args.duplicates)
+        results = {"rows": args.rows, "file_bytes": os.path.getsize(path)}
+        results["dictreader"] = _time(_parse_dictreader, path, args.repeat)
+        if arrow_available():
+            results["arrow"] = _time(_parse_arrow, path, args.repeat)
+            results["speedup"] = round(results["arrow"]["rows_per_sec"] / results["dictreader"]["rows_per_sec"], 2)
+        else:
+            results["arrow"] = "pyarrow not installed"
+    finally:
+        os.remove(path)
+    
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Synthetic product catalog generator for the benchmarks.
+
+    python -m benchmarks.catalog catalog.csv --rows 1000000 --duplicates 0.1
+"""
+import argparse
+import csv
+import random
+import string
+
+WORDS = ["steel", "widget", "premium", "cable", "adapter", "wireless", "compact", "ultra", "kit", "pro"]
+
+def generate_catalog(path, rows, duplicate_ratio=0.1, case_variation=0.3, description_length=80,
+                     invalid_ratio=0.01, seed=42):
+    """Writes a sku,name,description CSV with rows data rows.
+    
+    duplicate_ratio of the rows repeat an earlier SKU (so the file holds about
+    rows * (1 - duplicate_ratio) distinct SKUs), case_variation of the rows
+    have their SKU lowercased and padded with spaces, description_length is
+    the approximate description size in characters and invalid_ratio of the
+    rows have an empty name. Returns the number of distinct SKUs written.
+    """
+    rng = random.Random(seed)
+    unique = max(1, int(rows * (1 - duplicate_ratio)))
+    seen = set()
+    
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sku", "name", "description"])
+        
+        for i in range(rows):
+            # The first rows introduce every SKU once, duplicates follow
+            n = i if i < unique else rng.randrange(unique)
+            sku = f"SKU-{n:08d}"
+            if rng.random() < case_variation:
+                sku = f"  {sku.lower()} "
+            
+            name = "" if rng.random() < invalid_ratio else " ".join(rng.choices(WORDS, k=3)).title()
+            if name:
+                seen.add(n)
+            
+            words = []
+            while sum(len(w) + 1 for w in words) < description_length:
+                words.append(rng.choice(WORDS) if rng.random() < 0.8 else "".join(rng.choices(string.ascii_lowercase, k=8)))
+            writer.writerow([sku, name, " ".join(words)])
+    
+    return len(seen)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="fraction of rows repeating an earlier SKU")
+    parser.add_argument("--case-variation", type=float, default=0.3, help="fraction of SKUs lowercased and space padded")
+    parser.add_argument("--description-length", type=int, default=80)
+    parser.add_argument("--invalid", type=float, default=0.01, help="fraction of rows with an empty name")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    unique = generate_catalog(args.path, args.rows, args.duplicates, args.case_variation,
+                              args.description_length, args.invalid, args.seed)
+    print(f"Wrote {args.rows} rows ({unique} distinct valid SKUs) to {args.path}")
+
+if __name__ == "__main__":
+    main()
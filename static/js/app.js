@@ -56,8 +56,9 @@ fileInput.addEventListener('change', (e) => {
 });
 
 async function handleFileUpload(file) {
-    if (!file.name.endsWith('.csv')) {
-        showToast('Error', 'Please upload a CSV file', true);
+    const name = file.name.toLowerCase();
+    if (!['.csv', '.csv.gz', '.csv.zst'].some(suffix => name.endsWith(suffix))) {
+        showToast('Error', 'Please upload a CSV file (.csv, .csv.gz or .csv.zst)', true);
         return;
     }
     
@@ -237,6 +238,17 @@ document.getElementById('searchInput').addEventListener('keypress', (e) => {
 });
 document.getElementById('activeFilter').addEventListener('change', () => loadProducts(1));
 
+document.getElementById('exportBtn').addEventListener('click', () => {
+    const searchTerm = document.getElementById('searchInput').value;
+    const activeFilter = document.getElementById('activeFilter').value;
+    const params = new URLSearchParams({ format: 'csv' });
+    
+    if (searchTerm) params.append('search', searchTerm);
+    if (activeFilter) params.append('active', activeFilter);
+    
+    window.location.href = `/api/products/export?${params}`;
+});
+
 document.getElementById('addProductBtn').addEventListener('click', () => {
     document.getElementById('productModalTitle').textContent = 'Add Product';
     document.getElementById('productForm').reset();
@@ -333,8 +345,21 @@ document.getElementById('bulkDeleteBtn').addEventListener('click', async () => {
         const response = await fetch('/api/products', { method: 'DELETE' });
         const data = await response.json();
         
-        showToast('Success', data.message);
-        loadProducts(1);
+        showToast('Deleting', data.message);
+        
+        const eventSource = new EventSource(`/api/progress/${data.task_id}`);
+        eventSource.onmessage = (event) => {
+            const status = JSON.parse(event.data);
+            if (status.status === 'completed' || status.status === 'failed') {
+                eventSource.close();
+                showToast(status.status === 'completed' ? 'Success' : 'Error', status.message, status.status === 'failed');
+                loadProducts(1);
+            }
+        };
+        eventSource.onerror = () => {
+            eventSource.close();
+            loadProducts(1);
+        };
     } catch (error) {
         showToast('Error', 'Failed to delete products', true);
     }
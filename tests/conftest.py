@@ -5,6 +5,7 @@ from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 from app.database import Base, get_db
 from app.main import app
+import csv
 import os
 
 # Use in-memory SQLite for testing
@@ -28,7 +29,7 @@ def db():
         Base.metadata.drop_all(bind=engine)
 
 @pytest.fixture(scope="function")
-def client(db, mocker):
+def client(db, mocker, tmp_path):
     def override_get_db():
         try:
             yield db
@@ -36,6 +37,8 @@ def client(db, mocker):
             db.close()
     
     app.dependency_overrides[get_db] = override_get_db
+    # Uploads land in the test's tmp dir instead of the app's uploads/
+    mocker.patch("app.main.UPLOAD_DIR", str(tmp_path))
     
     # Mock init_db to prevent startup event from trying to connect to real DB
     with mocker.patch("app.main.init_db"):
@@ -44,11 +47,23 @@ def client(db, mocker):
     
     del app.dependency_overrides[get_db]
 
+@pytest.fixture
+def write_csv():
+    """Writes rows to a CSV file under the sku,name,description header"""
+    def write(file_path, rows):
+        with open(file_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["sku", "name", "description"])
+            writer.writerows(rows)
+    return write
+
 @pytest.fixture(autouse=True)
 def mock_celery(mocker):
     """Mock Celery tasks to avoid running them"""
     mocker.patch("app.tasks.import_csv_task.delay")
-    mocker.patch("app.tasks.trigger_webhooks.delay")
+    mocker.patch("app.tasks.import_stream_task.delay")
+    mocker.patch("app.tasks.bulk_delete_products_task.delay")
+    mocker.patch("app.tasks.relay_outbox_events.apply_async")
     return mocker
 
 @pytest.fixture(autouse=True)
@@ -58,3 +73,21 @@ def mock_redis(mocker):
     mock_redis.publish.return_value = None
     mock_redis.setex.return_value = None
     return mock_redis
+
+@pytest.fixture(autouse=True)
+def mock_cache_redis(mocker):
+    """Mock the cache's Redis client; every lookup is a miss"""
+    mock_redis = mocker.patch("app.cache.redis_client")
+    mock_redis.get.return_value = None
+    mock_redis.mget.side_effect = lambda keys: [None] * len(keys)
+    mock_redis.scan_iter.return_value = []
+    return mock_redis
+
+@pytest.fixture(autouse=True)
+def mock_progress_hub(mocker):
+    """Keep the SSE hub from connecting to Redis on app startup"""
+    from app.main import progress_hub
+    mocker.patch.object(progress_hub, "start", mocker.AsyncMock())
+    mocker.patch.object(progress_hub, "stop", mocker.AsyncMock())
+    mocker.patch.object(progress_hub, "get_status", mocker.AsyncMock(return_value=None))
+    return progress_hub
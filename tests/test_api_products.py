@@ -1,5 +1,18 @@
+import csv
+import gzip
+import io
+import json
+import asyncio
+import datetime
+from unittest.mock import DEFAULT
+import pytest
 from fastapi.testclient import TestClient
-from app.models import Product
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from app.database import Base, get_async_db
+from app.main import app
+from app.models import OutboxEvent, Product, Webhook
 
 def test_create_product(client: TestClient):
     response = client.post(
@@ -70,14 +83,235 @@ def test_delete_product(client: TestClient):
     get_res = client.get(f"/api/products/{product_id}")
     assert get_res.status_code == 404
 
-def test_bulk_delete(client: TestClient):
-    client.post("/api/products", json={"sku": "P1", "name": "Product 1"})
-    client.post("/api/products", json={"sku": "P2", "name": "Product 2"})
+def test_bulk_delete(client: TestClient, mocker):
+    mock_task = mocker.patch("app.main.bulk_delete_products_task.delay")
+    mock_task.return_value.id = "delete-task-id"
     
     response = client.delete("/api/products")
     assert response.status_code == 200
-    assert response.json()["count"] == 2
+    assert response.json()["task_id"] == "delete-task-id"
+    assert mock_task.called
+
+def test_keyset_pagination(client: TestClient):
+    ids = [
+        client.post("/api/products", json={"sku": f"K{i}", "name": f"Product {i}"}).json()["id"]
+        for i in range(5)
+    ]
+    
+    first = client.get("/api/products?per_page=2").json()
+    assert [p["id"] for p in first["items"]] == [ids[4], ids[3]]
+    assert first["next_after_id"] == ids[3]
+    assert first["prev_before_id"] is None
+    
+    second = client.get(f"/api/products?per_page=2&after_id={first['next_after_id']}").json()
+    assert [p["id"] for p in second["items"]] == [ids[2], ids[1]]
+    
+    last = client.get(f"/api/products?per_page=2&after_id={second['next_after_id']}").json()
+    assert [p["id"] for p in last["items"]] == [ids[0]]
+    assert last["next_after_id"] is None
+    
+    back = client.get(f"/api/products?per_page=2&before_id={last['prev_before_id']}").json()
+    assert [p["id"] for p in back["items"]] == [ids[2], ids[1]]
+
+def test_keyset_pagination_rejects_both_directions(client: TestClient):
+    for path in ("/api/products", "/api/async/products"):
+        response = client.get(f"{path}?after_id=5&before_id=2")
+        assert response.status_code == 400
+
+def test_list_products_count_modes(client: TestClient):
+    client.post("/api/products", json={"sku": "C1", "name": "Product 1"})
+    client.post("/api/products", json={"sku": "C2", "name": "Product 2"})
+    
+    no_count = client.get("/api/products?count=none").json()
+    assert no_count["total"] is None
+    assert no_count["pages"] is None
+    assert len(no_count["items"]) == 2
+    
+    # SQLite has no planner estimate, so this falls back to an exact count
+    estimated = client.get("/api/products?count=estimated").json()
+    assert estimated["total"] == 2
+    
+    assert client.get("/api/products?count=bogus").status_code == 422
+
+def test_export_products_csv(client: TestClient, db, mocker):
+    mocker.patch("app.main.EXPORT_BATCH_SIZE", 2)
+    db.add_all([
+        Product(sku="EX-1", name="Widget, large", description='Says "hi"'),
+        Product(sku="EX-2", name="Widget small"),
+        Product(sku="OTHER", name="Gadget"),
+    ])
+    db.commit()
+    
+    response = client.get("/api/products/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows == [
+        ["sku", "name", "description"],
+        ["EX-1", "Widget, large", 'Says "hi"'],
+        ["EX-2", "Widget small", ""],
+        ["OTHER", "Gadget", ""],
+    ]
+    
+    filtered = client.get("/api/products/export?search=widget")
+    assert [row[0] for row in csv.reader(io.StringIO(filtered.text))] == ["sku", "EX-1", "EX-2"]
+
+def test_export_products_ndjson_gzip(client: TestClient, db):
+    db.add_all([Product(sku="NJ-1", name="One"), Product(sku="NJ-2", name="Two", active=False)])
+    db.commit()
+    
+    response = client.get("/api/products/export?format=ndjson&gzip=true&active=true")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    assert 'filename="products.ndjson.gz"' in response.headers["content-disposition"]
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert [json.loads(line)["sku"] for line in lines] == ["NJ-1"]
+
+def _subscribe(db, *event_types):
+    for event_type in event_types:
+        db.add(Webhook(url=f"http://hooks.test/{event_type}", event_type=event_type))
+    db.commit()
+
+def test_batch_upsert_products(client: TestClient, db, mocker):
+    mocker.patch("app.main.schedule_outbox_relay")
+    _subscribe(db, "product.created", "product.updated")
+    db.add_all([Product(sku="BU-1", name="Same"), Product(sku="BU-2", name="Old")])
+    db.commit()
+    
+    response = client.post("/api/products/batch", json={"products": [
+        {"sku": "bu-1", "name": "Same"},
+        {"sku": "BU-2", "name": "New"},
+        {"sku": "BU-3", "name": "First"},
+        {"sku": "bu-3", "name": "Created"},
+    ]})
+    
+    assert response.status_code == 200
+    assert response.json() == {"created": 1, "updated": 1, "unchanged": 1}
+    assert sorted((p.sku, p.name) for p in db.query(Product)) == [("BU-1", "Same"), ("BU-2", "New"), ("bu-3", "Created")]
+    events = db.query(OutboxEvent).order_by(OutboxEvent.id).all()
+    assert sorted((e.event_type, e.payload["name"]) for e in events) == [("product.created", "Created"), ("product.updated", "New")]
+
+def test_batch_upsert_keeps_active_when_omitted(client: TestClient, db, mocker):
+    mocker.patch("app.main.schedule_outbox_relay")
+    db.add_all([Product(sku="BA-1", name="Off", active=False), Product(sku="BA-2", name="Off", active=False)])
+    db.commit()
+    
+    response = client.post("/api/products/batch", json={"products": [
+        {"sku": "BA-1", "name": "Renamed"},
+        {"sku": "BA-2", "name": "Off", "active": True},
+        {"sku": "BA-3", "name": "New"},
+    ]})
+    
+    assert response.json() == {"created": 1, "updated": 2, "unchanged": 0}
+    assert sorted((p.sku, p.name, p.active) for p in db.query(Product)) == [
+        ("BA-1", "Renamed", False), ("BA-2", "Off", True), ("BA-3", "New", True),
+    ]
+
+def test_batch_upsert_update_in_same_instant_is_not_created(client: TestClient, db, mocker):
+    """An existing product counts as updated even if its created_at equals the batch's timestamp"""
+    mocker.patch("app.main.schedule_outbox_relay")
+    now = datetime.datetime(2024, 1, 1, 12, 0, 0)
+    mocker.patch("app.main.datetime").datetime.utcnow.return_value = now
+    db.add(Product(sku="BT-1", name="Old", created_at=now))
+    db.commit()
+    
+    response = client.post("/api/products/batch", json={"products": [{"sku": "BT-1", "name": "New"}, {"sku": "BT-2", "name": "Fresh"}]})
+    
+    assert response.json() == {"created": 1, "updated": 1, "unchanged": 0}
+
+def test_batch_upsert_rejects_oversized_batch(client: TestClient, mocker):
+    mocker.patch("app.main.PRODUCT_BATCH_MAX", 1)
+    
+    response = client.post("/api/products/batch", json={"products": [{"sku": "A", "name": "A"}, {"sku": "B", "name": "B"}]})
+    assert response.status_code == 400
+
+def test_bulk_update_products_by_ids_and_filter(client: TestClient, db, mocker):
+    mocker.patch("app.main.schedule_outbox_relay")
+    _subscribe(db, "product.updated")
+    db.add_all([Product(sku=f"BP-{i}", name=f"Widget {i}") for i in range(3)] + [Product(sku="GD-1", name="Gadget", active=False)])
+    db.commit()
+    ids = [p.id for p in db.query(Product).filter(Product.sku.in_(["BP-0", "BP-1", "GD-1"]))]
+    
+    # GD-1 is already inactive, so it is not rewritten
+    response = client.patch("/api/products", json={"ids": ids, "values": {"active": False}})
+    assert response.json() == {"updated": 2}
+    assert sorted(p.sku for p in db.query(Product).filter(Product.active == False)) == ["BP-0", "BP-1", "GD-1"]
+    
+    response = client.patch("/api/products", json={"filter": {"search": "widget"}, "values": {"active": True, "description": "restocked"}})
+    assert response.json() == {"updated": 3}
+    assert db.query(Product).filter(Product.description == "restocked").count() == 3
+    assert db.query(OutboxEvent).count() == 5
+
+def test_bulk_update_requires_a_target(client: TestClient):
+    assert client.patch("/api/products", json={"values": {"active": False}}).status_code == 400
+    assert client.patch("/api/products", json={"filter": {}, "values": {"active": False}}).status_code == 400
+    assert client.patch("/api/products", json={"ids": [1], "values": {}}).status_code == 400
+
+def test_bulk_update_rejects_blank_filters(client: TestClient, db):
+    db.add(Product(sku="BF-1", name="Blank"))
+    db.commit()
+    
+    for blank in ("", "  "):
+        response = client.patch("/api/products", json={"filter": {"sku": blank, "search": blank}, "values": {"active": False}})
+        assert response.status_code == 400
+    assert db.query(Product).filter(Product.active == False).count() == 0
+
+def test_bulk_update_rejects_null_values(client: TestClient):
+    assert client.patch("/api/products", json={"ids": [1], "values": {"active": None}}).status_code == 400
+    assert client.patch("/api/products", json={"ids": [1], "values": {"name": None}}).status_code == 400
+
+@pytest.fixture
+def async_db_url(tmp_path):
+    """A file database (aiosqlite can't share a sync engine's :memory: one)
+    for the async routes to run on a real AsyncSession."""
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    setup_engine = create_engine(url)
+    Base.metadata.create_all(bind=setup_engine)
+    with Session(setup_engine) as session:
+        session.add(Webhook(url="http://hooks.test/created", event_type="product.created"))
+        session.commit()
+    setup_engine.dispose()
+    
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    sessions = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    
+    async def override_get_async_db():
+        async with sessions() as db:
+            yield db
+    
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    yield url
+    del app.dependency_overrides[get_async_db]
+
+def test_async_product_routes(client: TestClient, async_db_url, mock_redis, mock_cache_redis):
+    on_loop = []
+    
+    def record(*args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(args)
+        except RuntimeError:
+            pass
+        return DEFAULT
+    
+    for method in (mock_cache_redis.get, mock_cache_redis.setex, mock_cache_redis.incr,
+                   mock_cache_redis.delete, mock_cache_redis.pipeline, mock_redis.set):
+        method.side_effect = record
+    mock_cache_redis.mget.side_effect = lambda keys: record(keys) and [None] * len(keys)
+    
+    created = client.post("/api/async/products", json={"sku": "AS-1", "name": "Async"})
+    assert created.status_code == 200
+    product_id = created.json()["id"]
+    
+    assert client.get(f"/api/async/products/{product_id}").json()["sku"] == "AS-1"
+    assert client.put(f"/api/async/products/{product_id}", json={"name": "Renamed"}).json()["name"] == "Renamed"
+    assert client.get("/api/async/products", params={"search": "renamed"}).json()["total"] == 1
+    assert client.post("/api/async/products", json={"sku": "as-1", "name": "Dup"}).status_code == 400
+    assert client.delete(f"/api/async/products/{product_id}").status_code == 200
+    assert client.get(f"/api/async/products/{product_id}").status_code == 404
     
-    # Verify empty
-    list_res = client.get("/api/products")
-    assert list_res.json()["total"] == 0
+    with Session(create_engine(async_db_url)) as session:
+        assert session.query(OutboxEvent.event_type).scalar() == "product.created"
+    assert mock_redis.set.called  # the relay was scheduled
+    assert mock_cache_redis.incr.call_count == 3
+    assert on_loop == []
@@ -67,3 +67,27 @@ def test_test_webhook_endpoint(client: TestClient, mocker):
     response = client.post(f"/api/webhooks/{webhook_id}/test")
     assert response.status_code == 200
     assert response.json()["success"] is True
+
+def test_webhook_stats(client: TestClient, mock_redis):
+    create_res = client.post(
+        "/api/webhooks",
+        json={"url": "http://stats.com", "event_type": "product.created"}
+    )
+    webhook_id = create_res.json()["id"]
+    mock_redis.hgetall.return_value = {
+        b"delivered": b"3",
+        b"failed": b"1",
+        b"latency_count": b"4",
+        b"latency_ms_sum": b"100.0",
+        b"last_error": b"HTTP 500",
+    }
+    
+    response = client.get(f"/api/webhooks/{webhook_id}/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["delivered"] == 3
+    assert data["failed"] == 1
+    assert data["avg_latency_ms"] == 25.0
+    assert data["last_error"] == "HTTP 500"
+    
+    assert client.get("/api/webhooks/9999/stats").status_code == 404
@@ -0,0 +1,75 @@
+import io
+import csv
+import os
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from app.arrow_parser import iter_normalized_batches
+from app.tasks import import_csv_task
+from app.models import Product
+
+def _csv_bytes(rows, header=("sku", "name", "description")):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return io.BytesIO(buf.getvalue().encode())
+
+def test_normalizes_and_dedupes_last_wins():
+    f = _csv_bytes([
+        [" AR-1 ", " First ", "  "],
+        ["AR-2", "Second", "Desc"],
+        ["", "No SKU", ""],
+        ["AR-3", "  ", ""],
+        ["ar-1", "First Updated", "New"],
+    ])
+    
+    (records, valid_rows, products, keys), = iter_normalized_batches(f)
+    
+    assert records == 5
+    assert valid_rows == 3
+    assert keys == ["ar-2", "ar-1"]
+    assert products == [
+        {"sku": "AR-2", "name": "Second", "description": "Desc", "active": True},
+        {"sku": "ar-1", "name": "First Updated", "description": "New", "active": True},
+    ]
+
+def test_missing_description_column_and_skip():
+    f = _csv_bytes([["S-1", "One"], ["S-2", "Two"], ["S-3", "Three"]], header=("sku", "name"))
+    
+    (records, valid_rows, products, keys), = iter_normalized_batches(f, skip_records=2)
+    
+    assert records == 1
+    assert products == [{"sku": "S-3", "name": "Three", "description": None, "active": True}]
+
+def test_rejects_missing_columns():
+    with pytest.raises(ValueError):
+        list(iter_normalized_batches(_csv_bytes([["X", "Y"]], header=("code", "title"))))
+
+def test_import_with_arrow_parser(db, mock_redis, mocker):
+    """The arrow parser saves the same products as the DictReader path and checkpoints per block"""
+    mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.IMPORT_PARSER", "arrow")
+    mocker.patch("app.tasks.CHUNK_SIZE", 2)
+    mocker.patch("app.tasks.IMPORT_BATCH_ADAPTIVE", False)
+    
+    file_path = "temp_test_arrow.csv"
+    with open(file_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sku", "name", "description"])
+        writer.writerows([["AI-1", "One", ""], ["AI-2", "Two", ""], ["", "Bad", ""], ["ai-1", "One Updated", ""], ["AI-3", "Three", ""]])
+    
+    try:
+        result = import_csv_task.apply(args=[file_path]).result
+        
+        assert result["total_csv_rows"] == 4
+        assert db.query(Product).count() == 3
+        assert db.query(Product).filter(Product.sku == "ai-1").first().name == "One Updated"
+        checkpoint = mock_redis.pipeline.return_value.hset.call_args.kwargs["mapping"]
+        assert checkpoint == {"batch": 2, "saved": 3, "batch_size": 2, "created": 3, "updated": 0, "unchanged": 0, "records": 5, "rows": 4}
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
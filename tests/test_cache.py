@@ -0,0 +1,98 @@
+import json
+from fastapi.testclient import TestClient
+from app.cache import count_cache_key, get_webhook_subscriptions
+from app.models import Webhook
+
+def test_count_cache_key():
+    assert count_cache_key({"sku": "abc", "name": "x"}, 3) == count_cache_key({"name": "x", "sku": "abc"}, 3)
+    assert count_cache_key({"sku": "abc"}, 3) != count_cache_key({"sku": "abc "}, 3)
+    assert count_cache_key({"sku": "abc"}, 3) != count_cache_key({"sku": "abc"}, 4)
+    assert count_cache_key({"active": False}, 3) != count_cache_key({}, 3)
+
+def test_list_products_uses_cached_count(client: TestClient, mock_cache_redis):
+    client.post("/api/products", json={"sku": "P1", "name": "Product 1"})
+    mock_cache_redis.get.side_effect = lambda key: b"7" if key == "products:generation" else b"42"
+    
+    data = client.get("/api/products?sku=p").json()
+    assert data["total"] == 42
+    assert data["total_is_estimate"] is False
+    assert len(data["items"]) == 1
+    mock_cache_redis.setex.assert_not_called()
+
+def test_list_products_caches_count_on_miss(client: TestClient, mock_cache_redis):
+    client.post("/api/products", json={"sku": "P1", "name": "Product 1"})
+    
+    data = client.get("/api/products?name=product").json()
+    assert data["total"] == 1
+    key, ttl, total = mock_cache_redis.setex.call_args.args
+    assert key == count_cache_key({"name": "product"}, 0)
+    assert total == 1
+
+def test_list_products_counts_the_filters_it_queries(client: TestClient, mock_cache_redis):
+    """Padded or blank filters are cleaned once, so the cached total matches the rows listed"""
+    client.post("/api/products", json={"sku": "P1", "name": "Red car"})
+    client.post("/api/products", json={"sku": "P2", "name": "Blue car"})
+    
+    data = client.get("/api/products", params={"search": "red "}).json()
+    assert [p["name"] for p in data["items"]] == ["Red car"]
+    assert data["total"] == 1
+    assert mock_cache_redis.setex.call_args.args[0] == count_cache_key({"search": "red"}, 0)
+    
+    data = client.get("/api/products", params={"search": " ", "sku": ""}).json()
+    assert data["total"] == len(data["items"]) == 2
+    assert mock_cache_redis.setex.call_args.args[0] == count_cache_key({}, 0)
+
+def test_product_writes_bump_generation(client: TestClient, mock_cache_redis):
+    product_id = client.post("/api/products", json={"sku": "P1", "name": "Product 1"}).json()["id"]
+    client.put(f"/api/products/{product_id}", json={"name": "Renamed"})
+    client.delete(f"/api/products/{product_id}")
+    
+    bumps = [c for c in mock_cache_redis.incr.call_args_list if c.args == ("products:generation",)]
+    assert len(bumps) == 3
+
+def test_get_product_served_from_cache(client: TestClient, mock_cache_redis):
+    cached = {
+        "id": 999, "sku": "CACHED", "name": "Cached", "description": None, "active": True,
+        "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00",
+    }
+    mock_cache_redis.get.side_effect = lambda key: json.dumps(cached).encode() if key == "cache:product:999" else None
+    
+    response = client.get("/api/products/999")
+    assert response.status_code == 200
+    assert response.json()["sku"] == "CACHED"
+
+def test_get_product_miss_populates_cache(client: TestClient, mock_cache_redis):
+    product_id = client.post("/api/products", json={"sku": "P1", "name": "Product 1"}).json()["id"]
+    
+    client.get(f"/api/products/{product_id}")
+    key, ttl, value = mock_cache_redis.setex.call_args.args
+    assert key == f"cache:product:{product_id}"
+    assert json.loads(value)["sku"] == "P1"
+
+def test_product_update_invalidates_cache(client: TestClient, mock_cache_redis):
+    product_id = client.post("/api/products", json={"sku": "P1", "name": "Product 1"}).json()["id"]
+    
+    client.put(f"/api/products/{product_id}", json={"name": "Renamed"})
+    mock_cache_redis.delete.assert_called_with(f"cache:product:{product_id}")
+
+def test_webhook_subscriptions_read_through(db, mock_cache_redis):
+    db.add(Webhook(url="http://hooks.test/a", event_type="product.created"))
+    db.commit()
+    
+    subscriptions = get_webhook_subscriptions(db, ["product.created", "product.updated"])
+    assert subscriptions == {"product.created": [{"id": 1, "url": "http://hooks.test/a"}]}
+    
+    mock_cache_redis.mget.side_effect = lambda keys: [b'[{"id": 7, "url": "http://cached"}]', b"[]"]
+    subscriptions = get_webhook_subscriptions(db, ["product.created", "product.updated"])
+    assert subscriptions == {"product.created": [{"id": 7, "url": "http://cached"}]}
+
+def test_webhook_changes_invalidate_subscriptions(client: TestClient, mock_cache_redis):
+    client.post("/api/webhooks", json={"url": "http://a.com", "event_type": "product.created"})
+    mock_cache_redis.scan_iter.assert_called_with(match="cache:webhooks:*", count=1000)
+
+def test_cache_stats(client: TestClient, mock_cache_redis):
+    mock_cache_redis.hgetall.return_value = {b"product:hit": b"3", b"product:miss": b"1"}
+    
+    data = client.get("/api/cache/stats").json()
+    assert data["product"] == {"hits": 3, "misses": 1, "hit_ratio": 0.75}
+    assert data["webhooks"]["hit_ratio"] is None
@@ -77,3 +77,17 @@ def test_xss_protection(client):
     # Verify retrieval
     get_res = client.get(f"/api/products/{data['id']}")
     assert get_res.json()["name"] == xss_payload
+
+def test_trigram_indexes_are_postgres_only(db):
+    """Search filters get pg_trgm GIN indexes on PostgreSQL and nothing extra on SQLite"""
+    from sqlalchemy import text
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateIndex
+    
+    indexes = {ix.name: ix for ix in Product.__table__.indexes}
+    ddl = str(CreateIndex(indexes["ix_products_name_trgm"]).compile(dialect=postgresql.dialect()))
+    assert "USING gin (lower(name) gin_trgm_ops)" in ddl
+    
+    index_names = {row[0] for row in db.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    assert "ix_products_sku_lower" in index_names
+    assert not any(name.endswith("_trgm") for name in index_names)
@@ -0,0 +1,88 @@
+import os
+from app.tasks import import_csv_task
+from app.models import ImportBatch, OutboxEvent, Product, Webhook
+
+def _saved_checkpoints(mock_redis):
+    return [c.kwargs["mapping"] for c in mock_redis.pipeline.return_value.hset.call_args_list]
+
+def test_import_saves_checkpoint_per_batch(db, mock_redis, mocker, write_csv):
+    """Every committed batch records its byte offset, and a finished import clears it"""
+    mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.CHUNK_SIZE", 1)
+    mocker.patch("app.tasks.IMPORT_BATCH_ADAPTIVE", False)
+    db.add(Webhook(url="http://hooks.test/created", event_type="product.created"))
+    db.commit()
+    
+    file_path = "temp_test_checkpoint.csv"
+    write_csv(file_path, [["CK-1", "Product 1", ""], ["CK-2", "Product 2", ""]])
+    file_size = os.path.getsize(file_path)
+    
+    try:
+        result = import_csv_task.apply(args=[file_path], task_id="ck-task").result
+        
+        assert result["unique_products"] == 2
+        checkpoints = _saved_checkpoints(mock_redis)
+        assert [c["batch"] for c in checkpoints] == [1, 2]
+        assert checkpoints[-1] == {"offset": file_size, "batch": 2, "rows": 2, "saved": 2, "batch_size": 1, "created": 2, "updated": 0, "unchanged": 0}
+        assert [e.payload["sku"] for e in db.query(OutboxEvent).order_by(OutboxEvent.id)] == ["CK-1", "CK-2"]
+        mock_redis.delete.assert_any_call("import_checkpoint:ck-task")
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def test_redelivered_import_resumes_from_checkpoint(db, mock_redis, mocker, write_csv):
+    """A redelivered task skips the batches its earlier delivery already committed"""
+    mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.CHUNK_SIZE", 1)
+    db.add(Webhook(url="http://hooks.test/created", event_type="product.created"))
+    db.commit()
+    
+    file_path = "temp_test_resume.csv"
+    write_csv(file_path, [["RS-1", "Product 1", ""], ["RS-2", "Product 2", ""], ["RS-3", "Product 3", ""]])
+    with open(file_path, "rb") as f:
+        f.readline()
+        f.readline()
+        offset = f.tell()  # end of the first data row
+    
+    mock_redis.hgetall.return_value = {b"offset": str(offset).encode(), b"batch": b"1", b"rows": b"1", b"saved": b"1"}
+    
+    try:
+        result = import_csv_task.apply(args=[file_path], task_id="rs-task").result
+        
+        assert result["total_csv_rows"] == 3
+        assert result["unique_products"] == 3
+        assert sorted(p.sku for p in db.query(Product)) == ["RS-2", "RS-3"]
+        assert [e.payload["sku"] for e in db.query(OutboxEvent).order_by(OutboxEvent.id)] == ["RS-2", "RS-3"]
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def test_replayed_batch_adds_no_events(db, mock_redis, mocker, write_csv):
+    """A batch that committed before the crash but was never checkpointed adds its events only once"""
+    mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.CHUNK_SIZE", 1)
+    mocker.patch("app.tasks.IMPORT_BATCH_ADAPTIVE", False)
+    mocker.patch("app.tasks.IMPORT_SKIP_UNCHANGED", False)
+    db.add(Webhook(url="http://hooks.test/updated", event_type="product.updated"))
+    db.add(Product(sku="RP-1", name="Product 1"))
+    db.add(ImportBatch(import_id="rp-task", batch=1))  # committed by the first delivery
+    db.commit()
+    
+    file_path = "temp_test_replay.csv"
+    write_csv(file_path, [["RP-1", "Product 1", ""], ["RP-1", "Product 1 v2", ""]])
+    
+    try:
+        result = import_csv_task.apply(args=[file_path], task_id="rp-task").result
+        
+        assert result["status"] == "success"
+        assert [e.payload["name"] for e in db.query(OutboxEvent)] == ["Product 1 v2"]
+        assert db.query(ImportBatch).count() == 0
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
@@ -0,0 +1,87 @@
+import csv
+import os
+import pstats
+import pytest
+from fastapi.testclient import TestClient
+from app.profiling import StageTimer, capture_profile, merge_stage_summaries
+from app.tasks import import_csv_task
+
+def test_stage_timer_accumulates_and_buckets():
+    timer = StageTimer()
+    timer.record("flush", 0.0005)
+    timer.record("flush", 0.003)
+    timer.record("flush", 0.003)
+    timer.record("commit", 0.1)
+    
+    summary = timer.summary()
+    assert summary["flush"]["count"] == 3
+    assert summary["flush"]["total_ms"] == pytest.approx(6.5)
+    assert summary["flush"]["max_ms"] == pytest.approx(3.0)
+    assert summary["flush"]["histogram_ms"] == {"1": 1, "4": 2}
+    assert summary["commit"]["histogram_ms"] == {"128": 1}
+
+def test_merge_stage_summaries():
+    a, b = StageTimer(), StageTimer()
+    a.record("parse", 0.002)
+    b.record("parse", 0.004)
+    b.record("commit", 0.001)
+    
+    merged = merge_stage_summaries([a.summary(), b.summary(), None])
+    assert merged["parse"]["count"] == 2
+    assert merged["parse"]["total_ms"] == pytest.approx(6.0)
+    assert merged["parse"]["mean_ms"] == pytest.approx(3.0)
+    assert merged["parse"]["histogram_ms"] == {"2": 1, "4": 1}
+    assert merged["commit"]["count"] == 1
+
+def test_capture_profile_cprofile(tmp_path, mocker):
+    mocker.patch("app.profiling.PROFILE_DIR", str(tmp_path))
+    
+    with capture_profile("cprofile", "task-1") as info:
+        sum(range(1000))
+    
+    assert info["profile"] == os.path.join(str(tmp_path), "task-1.prof")
+    assert pstats.Stats(info["profile"]).total_calls > 0
+
+def test_capture_profile_off_and_unknown():
+    with capture_profile(None, "task-1") as info:
+        pass
+    assert info == {}
+    
+    with pytest.raises(ValueError):
+        with capture_profile("perf", "task-1"):
+            pass
+
+def test_import_reports_stage_timings(db, mock_redis, mocker, tmp_path):
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.profiling.PROFILE_DIR", str(tmp_path))
+    
+    file_path = str(tmp_path / "stages.csv")
+    with open(file_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sku", "name", "description"])
+        for i in range(5):
+            writer.writerow([f"SKU-{i}", f"Product {i}", ""])
+    
+    result = import_csv_task.apply(args=[file_path], kwargs={"profile": "cprofile"}).result
+    
+    for stage in ("parse", "select_existing", "flush", "commit", "cache_invalidate", "outbox", "unique_count"):
+        assert result["stages"][stage]["count"] >= 1
+    assert os.path.exists(result["profile"])
+    
+    completed = mock_publish.call_args_list[-1]
+    assert completed.args[1] == "completed"
+    assert completed.kwargs["extra"]["stages"] == result["stages"]
+    assert completed.kwargs["extra"]["profile"] == result["profile"]
+
+def test_upload_passes_profile_mode(client: TestClient, mocker):
+    mock_task = mocker.patch("app.tasks.import_csv_task.delay")
+    mock_task.return_value.id = "test-task-id"
+    files = {"file": ("test.csv", "sku,name\nA,B", "text/csv")}
+    
+    response = client.post("/api/upload?profile=cprofile", files=files)
+    assert response.status_code == 200
+    assert mock_task.call_args.args[2] == "cprofile"
+    
+    response = client.post("/api/upload?profile=perf", files=files)
+    assert response.status_code == 422
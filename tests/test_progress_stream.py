@@ -0,0 +1,57 @@
+import asyncio
+import json
+from fastapi.testclient import TestClient
+from app.progress_hub import ProgressHub
+
+def test_hub_dispatches_to_task_subscribers():
+    async def go():
+        hub = ProgressHub("redis://unused", queue_size=2)
+        first = hub.subscribe("task-1")
+        second = hub.subscribe("task-1")
+        other = hub.subscribe("task-2")
+        
+        for i in range(3):
+            hub._dispatch("progress:task-1", f"update-{i}")
+        
+        assert [first.get_nowait(), first.get_nowait()] == ["update-1", "update-2"]
+        assert second.qsize() == 2
+        assert other.empty()
+        
+        hub.unsubscribe("task-1", first)
+        hub.unsubscribe("task-1", second)
+        assert hub.connection_count == 1
+        assert "task-1" not in hub._subscribers
+    
+    asyncio.run(go())
+
+def test_progress_stream_ends_on_cached_terminal_status(client: TestClient, mock_progress_hub):
+    status = {"task_id": "t1", "status": "completed", "progress": 100, "message": "done"}
+    mock_progress_hub.get_status.return_value = json.dumps(status)
+    
+    response = client.get("/api/progress/t1")
+    
+    assert response.status_code == 200
+    assert response.text == f"data: {json.dumps(status)}\n\n"
+    assert mock_progress_hub.connection_count == 0
+
+def test_progress_stream_sends_heartbeats(client: TestClient, mock_progress_hub, mocker):
+    mocker.patch("app.main.SSE_HEARTBEAT_INTERVAL", 0.05)
+    
+    class SlowQueue:
+        calls = 0
+        
+        async def get(self):
+            SlowQueue.calls += 1
+            if SlowQueue.calls == 1:
+                await asyncio.sleep(1)
+            return json.dumps({"status": "failed", "message": "boom"})
+    
+    mocker.patch.object(mock_progress_hub, "subscribe", return_value=SlowQueue())
+    mocker.patch.object(mock_progress_hub, "unsubscribe")
+    
+    response = client.get("/api/progress/t2")
+    
+    events = response.text.split("\n\n")
+    assert events[0] == ": keepalive"
+    assert json.loads(events[1][len("data: "):])["status"] == "failed"
+    assert mock_progress_hub.unsubscribe.called
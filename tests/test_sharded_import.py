@@ -0,0 +1,243 @@
+import pytest
+import csv
+import os
+from app import tasks
+from app.tasks import (
+    import_csv_task,
+    import_csv_shard_task,
+    finalize_sharded_import,
+    fail_sharded_import,
+    _split_csv_by_sku,
+)
+from app.models import Product
+
+def _read_shard(shard_path):
+    with open(shard_path, newline="") as f:
+        return list(csv.DictReader(f))
+
+def test_split_keeps_duplicate_skus_in_one_shard(write_csv):
+    """Every case variant of a SKU lands in the same shard, in file order"""
+    file_path = "temp_test_split.csv"
+    write_csv(file_path, [
+        ["DUP-1", "First", ""],
+        ["OTHER-1", "Other 1", ""],
+        ["OTHER-2", "Other 2", ""],
+        ["dup-1", "Second", ""],
+        ["", "No SKU", ""],
+    ])
+    
+    shard_paths = []
+    try:
+        shard_paths, total = _split_csv_by_sku(file_path, 4)
+        
+        assert total == 4
+        assert len(shard_paths) == 4
+        
+        dup_shards = [
+            [row["name"] for row in _read_shard(path) if row["sku"].lower() == "dup-1"]
+            for path in shard_paths
+        ]
+        assert ["First", "Second"] in dup_shards
+        
+    finally:
+        for path in shard_paths + [file_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+def test_import_fans_out_to_chord(db, mocker, write_csv):
+    """Large uploads are split and dispatched as a chord of shard tasks"""
+    mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.IMPORT_SHARDS", 2)
+    mocker.patch("app.tasks.IMPORT_SHARD_MIN_BYTES", 0)
+    mock_chord = mocker.patch("app.tasks.chord")
+    
+    file_path = "temp_test_fan_out.csv"
+    write_csv(file_path, [["FAN-1", "Product 1", ""], ["FAN-2", "Product 2", ""]])
+    
+    try:
+        result = import_csv_task.apply(args=[file_path]).result
+        
+        assert result["status"] == "sharded"
+        assert result["total_csv_rows"] == 2
+        assert mock_chord.called
+        
+    finally:
+        for path in [file_path, f"{file_path}.shard0", f"{file_path}.shard1"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+def test_fan_out_passes_profile_to_shards(db, mocker, write_csv):
+    """The profile mode requested for the upload reaches every shard signature"""
+    mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.IMPORT_SHARDS", 2)
+    mocker.patch("app.tasks.IMPORT_SHARD_MIN_BYTES", 0)
+    mock_chord = mocker.patch("app.tasks.chord")
+    
+    file_path = "temp_test_fan_out_profile.csv"
+    write_csv(file_path, [["FP-1", "Product 1", ""], ["FP-2", "Product 2", ""]])
+    
+    try:
+        import_csv_task.apply(args=[file_path], kwargs={"profile": "cprofile"}).get()
+        
+        shard_signatures = mock_chord.call_args.args[0]
+        assert [sig.args[3] for sig in shard_signatures] == ["cprofile", "cprofile"]
+        
+    finally:
+        for path in [file_path, f"{file_path}.shard0", f"{file_path}.shard1"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+def test_shard_uses_arrow_parser_and_profile(db, mock_redis, mocker, tmp_path, write_csv):
+    """A shard honours IMPORT_PARSER=arrow and writes its own profile, which finalize collects"""
+    pytest.importorskip("pyarrow")
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.IMPORT_PARSER", "arrow")
+    mocker.patch("app.profiling.PROFILE_DIR", str(tmp_path))
+    mock_arrow = mocker.patch("app.tasks._import_arrow", wraps=tasks._import_arrow)
+    mock_redis.pipeline.return_value.execute.return_value = [2, True, {b"shard0:rows": b"1", b"shard0:saved": b"0"}]
+    
+    file_path = "temp_test_shard_arrow.csv"
+    write_csv(file_path, [["SA-1", "Product 1", ""], ["SA-2", "Product 2", ""]])
+    
+    shard_paths, total = _split_csv_by_sku(file_path, 1)
+    try:
+        shard_result = import_csv_shard_task.apply(args=["parent-id", shard_paths[0], total, "cprofile"]).result
+        result = finalize_sharded_import.apply(args=[[shard_result], "parent-id", file_path, total]).result
+        
+        assert mock_arrow.called
+        assert db.query(Product).count() == 2
+        assert shard_result["profile"] == os.path.join(str(tmp_path), "parent-id-shard0.prof")
+        assert result["profiles"] == [shard_result["profile"]]
+        assert mock_publish.call_args_list[-1].kwargs["extra"]["profiles"] == [shard_result["profile"]]
+        
+    finally:
+        for path in shard_paths + [file_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+def test_shards_import_and_finalize(db, mock_redis, mocker, write_csv):
+    """Shard tasks upsert their rows and the chord callback publishes the combined result"""
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mock_redis.pipeline.return_value.execute.return_value = [2, True, {b"shard0:rows": b"1", b"shard0:saved": b"0"}]
+    
+    file_path = "temp_test_shards.csv"
+    write_csv(file_path, [
+        ["SH-1", "Product 1", ""],
+        ["SH-2", "Product 2", ""],
+        ["sh-1", "Product 1 Updated", ""],
+    ])
+    
+    shard_paths, total = _split_csv_by_sku(file_path, 2)
+    try:
+        shard_results = [
+            import_csv_shard_task.apply(args=["parent-id", path, total]).result
+            for path in shard_paths
+        ]
+        result = finalize_sharded_import.apply(args=[shard_results, "parent-id", file_path, total]).result
+        
+        assert result["status"] == "success"
+        assert result["unique_products"] == 2
+        assert db.query(Product).count() == 2
+        assert db.query(Product).filter(Product.sku == "sh-1").first().name == "Product 1 Updated"
+        assert mock_publish.call_args_list[-1].args[:2] == ("parent-id", "completed")
+        assert not os.path.exists(file_path)
+        
+    finally:
+        for path in shard_paths + [file_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+def test_fan_out_checkpoints_before_dispatching_chord(db, mock_redis, mocker, write_csv):
+    """The shard checkpoint exists before the chord is sent, and is dropped if sending fails"""
+    mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.IMPORT_SHARDS", 2)
+    mocker.patch("app.tasks.IMPORT_SHARD_MIN_BYTES", 0)
+    mock_redis.hgetall.return_value = {}
+    saves = mock_redis.pipeline.return_value.hset
+    mock_chord = mocker.patch("app.tasks.chord")
+    mock_chord.return_value.side_effect = lambda body: saves.assert_called_with("import_checkpoint:fan-task", mapping={"shards": 2, "total": 2})
+    
+    file_path = "temp_test_fan_out_order.csv"
+    write_csv(file_path, [["FO-1", "Product 1", ""], ["FO-2", "Product 2", ""]])
+    
+    try:
+        import_csv_task.apply(args=[file_path], task_id="fan-task").get()
+        
+        mock_chord.return_value.side_effect = ConnectionError("broker down")
+        with pytest.raises(ConnectionError):
+            import_csv_task.apply(args=[file_path], task_id="fan-task-2").get()
+        mock_redis.delete.assert_any_call("import_checkpoint:fan-task-2")
+        assert not os.path.exists(f"{file_path}.shard0")
+        
+    finally:
+        for path in [file_path, f"{file_path}.shard0", f"{file_path}.shard1"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+def test_failed_shard_records_error_instead_of_publishing(db, mock_redis, mocker, write_csv):
+    """A shard error is left for the chord errback, which publishes after every shard"""
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks._bulk_upsert_products", side_effect=RuntimeError("db gone"))
+    
+    file_path = "temp_test_shard_fail.csv"
+    write_csv(file_path, [["SF-1", "Product 1", ""]])
+    
+    try:
+        with pytest.raises(RuntimeError):
+            import_csv_shard_task.apply(args=["parent-id", file_path, 1]).get()
+        
+        mock_redis.hsetnx.assert_called_once_with("import_shards:parent-id", "failed", "Import failed: db gone")
+        assert not any(c.args[1] == "failed" for c in mock_publish.call_args_list)
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def test_shard_stops_after_sibling_failed(db, mock_redis, mocker, write_csv):
+    """Once a sibling has failed a shard stops importing and publishes no progress"""
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.CHUNK_SIZE", 50)
+    mocker.patch("app.tasks.IMPORT_BATCH_ADAPTIVE", False)
+    # Publish synchronously so the failure is seen on the first update
+    mocker.patch("app.tasks.ProgressReporter.update", lambda self, *args: self._publish(*args))
+    mock_redis.hgetall.return_value = {}
+    mock_redis.pipeline.return_value.execute.return_value = [1, True, {b"failed": b"Import failed: db gone"}]
+    
+    file_path = "temp_test_shard_abort.csv"
+    write_csv(file_path, [[f"SA-{i}", f"Product {i}", ""] for i in range(500)])
+    
+    try:
+        with pytest.raises(Exception, match="another shard failed"):
+            import_csv_shard_task.apply(args=["parent-id", file_path, 500]).get()
+        
+        # Stopped at the first progress update, after row 100
+        assert db.query(Product).count() == 50
+        assert not mock_publish.called
+        assert not mock_redis.hsetnx.called
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def test_errback_publishes_failure_and_removes_files(mock_redis, mocker, write_csv):
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mock_redis.hget.return_value = b"Import failed: db gone"
+    
+    file_path = "temp_test_errback.csv"
+    write_csv(file_path, [["EB-1", "Product 1", ""]])
+    shard_paths, _ = _split_csv_by_sku(file_path, 2)
+    os.remove(shard_paths[0])  # a shard that finished removes its own file
+    
+    fail_sharded_import(None, RuntimeError("chord failed"), None, "parent-id", file_path, shard_paths)
+    
+    mock_publish.assert_called_once_with("parent-id", "failed", 0, "Import failed: db gone")
+    mock_redis.delete.assert_any_call("import_shards:parent-id")
+    mock_redis.delete.assert_any_call("import_checkpoint:parent-id")
+    assert not any(os.path.exists(path) for path in shard_paths + [file_path])
@@ -1,9 +1,12 @@
 import pytest
 import csv
+import gzip
 import os
+import time
+import datetime
 from fastapi.testclient import TestClient
-from app.tasks import import_csv_task
-from app.models import Product
+from app.tasks import import_csv_task, ProgressReporter, publish_progress, _UniqueSkuCounter, AdaptiveBatchSizer, _BatchUpserter
+from app.models import OutboxEvent, Product, Webhook
 
 def test_upload_endpoint(client: TestClient, mocker):
     # Mock the Celery task delay method
@@ -30,7 +33,6 @@ def test_import_csv_task_logic(db, mock_redis, mocker):
     """Test the actual import logic without Celery/Redis"""
     # Mock publish_progress to avoid Redis calls
     mocker.patch("app.tasks.publish_progress")
-    mocker.patch("app.tasks.trigger_webhooks.delay")
     
     # Create a temporary CSV file
     file_path = "temp_test_import.csv"
@@ -65,7 +67,6 @@ def test_import_csv_task_logic(db, mock_redis, mocker):
 def test_import_duplicates_logic(db, mock_redis, mocker):
     """Test duplicate handling (case-insensitive overwrite)"""
     mocker.patch("app.tasks.publish_progress")
-    mocker.patch("app.tasks.trigger_webhooks.delay")
     mocker.patch("app.tasks.SessionLocal", return_value=db)
     
     file_path = "temp_test_duplicates.csv"
@@ -105,7 +106,6 @@ def test_import_csv_task_logic(db, mock_redis, mocker):
     """Test the actual import logic without Celery/Redis"""
     # Mock publish_progress to avoid Redis calls
     mocker.patch("app.tasks.publish_progress")
-    mocker.patch("app.tasks.trigger_webhooks.delay")
     
     # Create a temporary CSV file
     file_path = "temp_test_import.csv"
@@ -140,7 +140,6 @@ def test_import_csv_task_logic(db, mock_redis, mocker):
 def test_import_duplicates_logic(db, mock_redis, mocker):
     """Test duplicate handling (case-insensitive overwrite)"""
     mocker.patch("app.tasks.publish_progress")
-    mocker.patch("app.tasks.trigger_webhooks.delay")
     mocker.patch("app.tasks.SessionLocal", return_value=db)
     
     file_path = "temp_test_duplicates.csv"
@@ -164,3 +163,307 @@ def test_import_duplicates_logic(db, mock_redis, mocker):
     finally:
         if os.path.exists(file_path):
             os.remove(file_path)
+
+def test_import_engine_resolution(db, mocker):
+    """SQLite falls back to the ORM engine unless one is forced"""
+    from app.tasks import _resolve_import_engine
+    
+    assert _resolve_import_engine(db) == "orm"
+    
+    mocker.patch("app.tasks.IMPORT_ENGINE", "copy")
+    assert _resolve_import_engine(db) == "copy"
+
+def test_copy_buffer_quoting():
+    """NULL descriptions stay unquoted, everything else is quoted and escaped"""
+    from app.tasks import _build_copy_buffer
+    
+    buf = _build_copy_buffer([
+        {"sku": "A-1", "name": 'Say "hi"', "description": None},
+        {"sku": "B-2", "name": "Two,Parts", "description": "line1\nline2"},
+    ])
+    
+    assert buf.read() == '"A-1","Say ""hi""",\n"B-2","Two,Parts","line1\nline2"\n'
+
+def test_import_single_pass_fills_totals(db, mocker):
+    """Single-pass mode skips the counting pass and reports totals at the end"""
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.IMPORT_SINGLE_PASS", True)
+    
+    file_path = "temp_test_single_pass.csv"
+    with open(file_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sku", "name", "description"])
+        writer.writerow(["SP-1", "Product 1", ""])
+        writer.writerow(["SP-2", "Product 2", ""])
+        writer.writerow(["", "Missing SKU", ""])
+    
+    try:
+        result = import_csv_task.apply(args=[file_path, os.path.getsize(file_path)]).result
+        
+        assert result["total_csv_rows"] == 2
+        statuses = [c.args[1] for c in mock_publish.call_args_list]
+        assert "counting" not in statuses
+        assert statuses[-1] == "completed"
+        assert mock_publish.call_args_list[-1].args[4:] == (2, 2)
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def test_import_counting_pass(db, mocker):
+    """The counting pass is still available when single-pass mode is off"""
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.IMPORT_SINGLE_PASS", False)
+    
+    file_path = "temp_test_counting.csv"
+    with open(file_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sku", "name"])
+        writer.writerow(["CP-1", "Product 1"])
+    
+    try:
+        result = import_csv_task.apply(args=[file_path]).result
+        
+        assert result["total_csv_rows"] == 1
+        assert mock_publish.call_args_list[0].args[1] == "counting"
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def test_progress_reporter_coalesces_updates():
+    """Bursts of updates collapse into a few publishes, ending on the latest one"""
+    published = []
+    reporter = ProgressReporter(lambda *args: published.append(args), min_interval=0.2)
+    
+    for i in range(1000):
+        reporter.update("importing", i)
+    reporter.close()
+    
+    assert len(published) < 10
+    assert published[-1] == ("importing", 999)
+    
+    reporter.update("importing", 1000)
+    assert published[-1] == ("importing", 999)
+
+def test_progress_reporter_survives_publish_errors():
+    calls = []
+    
+    def flaky_publish(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise ConnectionError("redis down")
+    
+    reporter = ProgressReporter(flaky_publish, min_interval=0)
+    reporter.update("importing", 1)
+    time.sleep(0.05)
+    reporter.update("importing", 2)
+    reporter.close()
+    
+    assert calls[-1] == ("importing", 2)
+
+def test_publish_progress_pipelines_publish_and_status(mocker):
+    mock_redis = mocker.patch("app.tasks.redis_client")
+    pipe = mock_redis.pipeline.return_value
+    
+    publish_progress("task-1", "importing", 50, "halfway", 10, 5)
+    
+    mock_redis.pipeline.assert_called_once_with(transaction=False)
+    assert pipe.publish.call_args.args[0] == "progress:task-1"
+    assert pipe.setex.call_args.args[0] == "task_status:task-1"
+    pipe.execute.assert_called_once()
+    mock_redis.publish.assert_not_called()
+
+def test_upload_endpoint_keeps_compressed_suffix(client: TestClient, mocker):
+    mock_task = mocker.patch("app.tasks.import_csv_task.delay")
+    mock_task.return_value.id = "gz-task-id"
+    
+    files = {"file": ("export.CSV.GZ", gzip.compress(b"sku,name\nGZ-1,Test\n"), "application/gzip")}
+    response = client.post("/api/upload", files=files)
+    
+    assert response.status_code == 200
+    file_path = mock_task.call_args.args[0]
+    try:
+        assert file_path.endswith(".csv.gz")
+    finally:
+        os.remove(file_path)
+    
+    files = {"file": ("export.txt", b"sku,name\n", "text/plain")}
+    assert client.post("/api/upload", files=files).status_code == 400
+
+@pytest.mark.parametrize("single_pass", [True, False])
+def test_import_gzip_upload(db, mocker, single_pass):
+    """.csv.gz uploads are decompressed while they are parsed"""
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.IMPORT_SINGLE_PASS", single_pass)
+    
+    file_path = "temp_test_import.csv.gz"
+    with gzip.open(file_path, "wt", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sku", "name", "description"])
+        for i in range(50):
+            writer.writerow([f"GZ-{i}", f"Product {i}", "x" * 100])
+    
+    try:
+        result = import_csv_task.apply(args=[file_path]).result
+        
+        assert result["total_csv_rows"] == 50
+        assert db.query(Product).count() == 50
+        assert mock_publish.call_args.args[1] == "completed"
+        assert not os.path.exists(file_path)
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def test_import_zstd_upload(db, mocker):
+    zstandard = pytest.importorskip("zstandard")
+    mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    
+    file_path = "temp_test_import.csv.zst"
+    with open(file_path, "wb") as f:
+        f.write(zstandard.ZstdCompressor().compress(b"sku,name\nZS-1,Product 1\nZS-2,Product 2\n"))
+    
+    try:
+        result = import_csv_task.apply(args=[file_path]).result
+        
+        assert result["unique_products"] == 2
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def test_unique_sku_counter_batches_pfadd(mock_redis, mocker):
+    mocker.patch.object(_UniqueSkuCounter, "PFADD_CHUNK", 2)
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.return_value = [1, 1, 0, True, 3]
+    
+    counter = _UniqueSkuCounter("task-1")
+    counter.extend(["a", "b", "c"])
+    counter.add("a")
+    
+    assert counter.flush() == 3
+    assert [c.args for c in pipe.pfadd.call_args_list] == [("import_skus:task-1", "a", "b"), ("import_skus:task-1", "c", "a")]
+    pipe.pfcount.assert_called_once_with("import_skus:task-1")
+    assert counter.pending == []
+
+def test_import_reports_hyperloglog_unique_count(db, mock_redis, mocker):
+    """Progress messages use the PFCOUNT estimate and the HLL key is dropped when the import completes"""
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mock_redis.pipeline.return_value.execute.return_value = [1, True, 2]
+    
+    file_path = "temp_test_hll.csv"
+    with open(file_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sku", "name"])
+        for i in range(150):
+            writer.writerow([f"HLL-{i % 2}", f"Product {i}"])
+    
+    try:
+        result = import_csv_task.apply(args=[file_path], task_id="hll-task").result
+        
+        assert result["unique_products"] == 2
+        messages = [c.args[3] for c in mock_publish.call_args_list if c.args[1] == "importing"]
+        assert any("(2 unique" in m for m in messages)
+        # One batch, so one flush at its commit and none for the progress update at row 100
+        assert mock_redis.pipeline.return_value.pfcount.call_count == 1
+        assert mock_redis.pipeline.return_value.pfadd.call_args.args[0] == "import_skus:hll-task"
+        mock_redis.delete.assert_any_call("import_skus:hll-task")
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def test_adaptive_batch_sizer_steers_toward_target():
+    sizer = AdaptiveBatchSizer(1000, 100, 5000, target_ms=500)
+    
+    # 0.1 ms/row would allow 5000 rows, but growth is capped at 2x per batch
+    sizer.record(1000, 0.1)
+    assert sizer.size == 2000
+    sizer.record(2000, 0.2)
+    sizer.record(4000, 0.4)
+    assert sizer.size == 5000
+    
+    # A slow batch halves the size at most, never below the minimum
+    for _ in range(10):
+        sizer.record(sizer.size, 10.0)
+    assert sizer.size == 100
+    
+    summary = sizer.summary()
+    assert summary["initial"] == 1000
+    assert summary["max"] == 5000
+    assert summary["batches"] == 13
+
+def test_batch_size_default_cap(db, mocker):
+    """Without IMPORT_BATCH_MAX, batches grow to at most twice the starting size"""
+    mocker.patch("app.tasks.CHUNK_SIZE", 1000)
+    
+    sizer = _BatchUpserter(db).sizer
+    
+    assert (sizer.minimum, sizer.maximum) == (100, 2000)
+
+def test_import_result_reports_batch_sizes(db, mocker):
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.CHUNK_SIZE", 10)
+    
+    file_path = "temp_test_batch_sizes.csv"
+    with open(file_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sku", "name"])
+        for i in range(200):
+            writer.writerow([f"BS-{i}", f"Product {i}"])
+    
+    try:
+        result = import_csv_task.apply(args=[file_path]).result
+        
+        batch_sizes = result["batch_sizes"]
+        assert batch_sizes["initial"] == 10
+        assert batch_sizes["max"] > 10
+        assert batch_sizes["batches"] < 20
+        messages = [c.args[3] for c in mock_publish.call_args_list if c.args[1] == "importing"]
+        assert any("batch size" in m for m in messages)
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+def test_reimport_skips_unchanged_rows(db, mocker):
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    
+    stale = datetime.datetime(2020, 1, 1)
+    db.add_all([
+        Webhook(url="http://hooks.test/created", event_type="product.created"),
+        Webhook(url="http://hooks.test/updated", event_type="product.updated"),
+        Product(sku="CD-1", name="Same", description="Same desc", updated_at=stale),
+        Product(sku="CD-2", name="Old name", description=None, updated_at=stale),
+    ])
+    db.commit()
+    
+    file_path = "temp_test_change_detection.csv"
+    with open(file_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sku", "name", "description"])
+        writer.writerow(["cd-1", "Same", "Same desc"])
+        writer.writerow(["CD-2", "New name", ""])
+        writer.writerow(["CD-3", "Brand new", ""])
+    
+    try:
+        result = import_csv_task.apply(args=[file_path]).result
+        
+        assert (result["created"], result["updated"], result["unchanged"]) == (1, 1, 1)
+        assert "1 created, 1 updated, 1 unchanged" in mock_publish.call_args_list[-1].args[3]
+        events = db.query(OutboxEvent).order_by(OutboxEvent.id).all()
+        assert [(e.event_type, e.payload["sku"]) for e in events] == [("product.updated", "CD-2"), ("product.created", "CD-3")]
+        assert db.query(Product).filter(Product.sku == "CD-1").first().updated_at == stale
+        assert db.query(Product).filter(Product.sku == "CD-2").first().name == "New name"
+        
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
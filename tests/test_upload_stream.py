@@ -0,0 +1,123 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.tasks import import_stream_task
+from app.models import Product
+
+CSV_BODY = b"sku,name,description\nST-1,Product 1,\nST-2,Product 2,Desc\nst-1,Product 1 Updated,\n"
+
+def _stream_entries(body, chunk_size):
+    """Entries as forward_upload writes them: the header line, then chunk_size pieces"""
+    head = body.index(b"\n") + 1
+    entries = [{b"data": body[:head], b"offset": b"0"}]
+    entries += [{b"data": body[i:i + chunk_size], b"offset": str(i).encode()} for i in range(head, len(body), chunk_size)]
+    return entries + [{b"eof": b"1"}]
+
+def _serve_stream(mock_redis, entries, deleted=()):
+    """Serves pre-recorded stream entries to RedisStreamReader in small XREAD
+    pages, leaving out the (1-based) entry numbers in deleted"""
+    entries = [(i, f"{i}-0".encode(), fields) for i, fields in enumerate(entries, 1) if i not in deleted]
+    
+    def xread(streams, count, block):
+        (key, last_id), = streams.items()
+        after = 0 if last_id == "0" else int(last_id.split(b"-")[0])
+        page = [(entry_id, fields) for i, entry_id, fields in entries if i > after][:2]
+        return [[key.encode(), page]] if page else []
+    
+    mock_redis.xread.side_effect = xread
+
+def test_stream_upload_forwards_chunks(client: TestClient, mocker):
+    mocker.patch("app.upload_stream.UPLOAD_STREAM_CHUNK_SIZE", 16)
+    mock_redis = mocker.patch("app.main.progress_hub.redis", new=mocker.MagicMock())
+    mock_redis.xadd = mocker.AsyncMock()
+    mock_redis.expire = mocker.AsyncMock()
+    mock_task = mocker.patch("app.main.import_stream_task.delay")
+    mock_task.return_value.id = "stream-task-id"
+    
+    response = client.post("/api/upload/stream", content=CSV_BODY, headers={"Content-Type": "text/csv"})
+    
+    assert response.status_code == 200
+    assert response.json()["task_id"] == "stream-task-id"
+    
+    stream_key, file_size, profile = mock_task.call_args.args
+    assert profile is None
+    assert stream_key.startswith("upload:")
+    assert file_size == len(CSV_BODY)
+    
+    entries = [c.args[1] for c in mock_redis.xadd.call_args_list]
+    assert entries[-1] == {"eof": "1"}
+    assert entries[0]["data"].startswith(b"sku,name,description\n")
+    assert all(len(e["data"]) <= 16 for e in entries[1:-1])
+    assert b"".join(e["data"] for e in entries[:-1]) == CSV_BODY
+    assert [e["offset"] for e in entries[:-1]] == [sum(len(p["data"]) for p in entries[:i]) for i in range(len(entries) - 1)]
+
+def test_stream_upload_rejects_missing_columns(client: TestClient, mocker):
+    mock_task = mocker.patch("app.main.import_stream_task.delay")
+    
+    response = client.post("/api/upload/stream", content=b"code,title\nA,B\n")
+    
+    assert response.status_code == 400
+    assert not mock_task.called
+
+def test_stream_import_task(db, mock_redis, mocker):
+    """The worker reads CSV lines split across stream entries and upserts them"""
+    mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    _serve_stream(mock_redis, _stream_entries(CSV_BODY, 7))
+    
+    result = import_stream_task.apply(args=["upload:test", len(CSV_BODY)]).result
+    
+    assert result["total_csv_rows"] == 3
+    assert result["unique_products"] == 2
+    assert db.query(Product).filter(Product.sku == "st-1").first().name == "Product 1 Updated"
+    mock_redis.delete.assert_any_call("upload:test")
+
+def test_stream_import_fails_on_aborted_upload(db, mock_redis, mocker):
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    _serve_stream(mock_redis, _stream_entries(CSV_BODY, 20)[:2] + [{b"error": b"ClientDisconnect: "}])
+    
+    with pytest.raises(IOError):
+        import_stream_task.apply(args=["upload:aborted"]).get()
+    
+    assert mock_publish.call_args.args[1] == "failed"
+
+def test_stream_import_accepts_bom(db, mock_redis, mocker):
+    """A byte order mark passes the API's header check and is dropped by the worker too"""
+    mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    body = b"\xef\xbb\xbf" + CSV_BODY
+    _serve_stream(mock_redis, _stream_entries(body, 7))
+    
+    result = import_stream_task.apply(args=["upload:bom", len(body)]).get()
+    
+    assert result["unique_products"] == 2
+
+def test_stream_import_trims_checkpointed_entries(db, mock_redis, mocker):
+    """Each checkpoint deletes the entries between the header and its offset"""
+    mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.CHUNK_SIZE", 1)
+    mocker.patch("app.tasks.IMPORT_BATCH_ADAPTIVE", False)
+    mock_redis.hgetall.return_value = {}
+    entries = _stream_entries(CSV_BODY, 7)
+    _serve_stream(mock_redis, entries)
+    
+    import_stream_task.apply(args=["upload:trim", len(CSV_BODY)]).get()
+    
+    deleted = [entry_id for c in mock_redis.xdel.call_args_list for entry_id in c.args[1:]]
+    # Entry 1 is the header; the last checkpoint (end of file) is inside the last data entry
+    assert deleted == [f"{i}-0".encode() for i in range(2, len(entries) - 1)]
+
+def test_stream_import_resumes_from_trimmed_stream(db, mock_redis, mocker):
+    """A redelivered stream import reads the header entry, then skips to its checkpoint"""
+    mocker.patch("app.tasks.publish_progress")
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    offset = CSV_BODY.index(b"ST-2")
+    # Entries 2 and 3 (bytes 21-34) were deleted after the checkpoint at the end of the ST-1 row
+    _serve_stream(mock_redis, _stream_entries(CSV_BODY, 7), deleted=(2, 3))
+    mock_redis.hgetall.return_value = {b"offset": str(offset).encode(), b"batch": b"1", b"rows": b"1", b"saved": b"1"}
+    
+    result = import_stream_task.apply(args=["upload:resume", len(CSV_BODY)]).get()
+    
+    assert result["total_csv_rows"] == 3
+    assert sorted(p.sku for p in db.query(Product)) == ["ST-2", "st-1"]
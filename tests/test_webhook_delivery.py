@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app.webhook_delivery import WebhookDeliveryEngine
+
+class StubServer:
+    """Local HTTP endpoint that answers with a scripted list of status codes"""
+    
+    def __init__(self, statuses, delay=0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.hits = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub.lock:
+                    stub.hits += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    status = stub.statuses.pop(0) if len(stub.statuses) > 1 else stub.statuses[0]
+                time.sleep(stub.delay)
+                with stub.lock:
+                    stub.in_flight -= 1
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    
+    def __enter__(self):
+        self.thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def _run(engine, deliveries):
+    async def go():
+        try:
+            return await engine.deliver_many(deliveries)
+        finally:
+            await engine.aclose()
+    return asyncio.run(go())
+
+def test_retries_until_success():
+    with StubServer([503, 200]) as stub:
+        engine = WebhookDeliveryEngine(max_retries=2, backoff_base=0.01)
+        results = _run(engine, [(1, stub.url, {"event": "product.created"})])
+    
+    assert results == [True]
+    assert stub.hits == 2
+    stats = engine.pop_stats()[1]
+    assert stats["delivered"] == 1
+    assert stats["retried"] == 1
+    assert stats["latency_count"] == 2
+
+def test_client_errors_are_not_retried():
+    with StubServer([404]) as stub:
+        engine = WebhookDeliveryEngine(max_retries=3, backoff_base=0.01)
+        results = _run(engine, [(1, stub.url, {})])
+    
+    assert results == [False]
+    assert stub.hits == 1
+    assert engine.pop_stats()[1]["last_error"] == "HTTP 404"
+
+def test_circuit_breaker_stops_calling_failing_endpoint():
+    with StubServer([500]) as stub:
+        engine = WebhookDeliveryEngine(max_retries=0, max_per_endpoint=1, breaker_threshold=2, breaker_reset=60)
+        results = _run(engine, [(1, stub.url, {}) for _ in range(5)])
+    
+    assert results == [False] * 5
+    assert stub.hits == 2
+    stats = engine.pop_stats()[1]
+    assert stats["failed"] == 2
+    assert stats["short_circuited"] == 3
+    assert engine.breaker(stub.url).is_open
+
+def test_concurrency_is_capped_per_endpoint():
+    with StubServer([200], delay=0.05) as stub:
+        engine = WebhookDeliveryEngine(max_per_endpoint=2)
+        results = _run(engine, [(1, stub.url, {}) for _ in range(6)])
+    
+    assert results == [True] * 6
+    assert stub.max_in_flight <= 2
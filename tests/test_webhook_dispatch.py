@@ -0,0 +1,195 @@
+from app.tasks import bulk_delete_products_task, relay_outbox_events, add_outbox_events
+from app.models import OutboxEvent, Product, Webhook
+from app.database import migrate_columns
+from sqlalchemy import inspect, text
+
+def _setup(db):
+    db.add_all([
+        Webhook(url="http://hooks.test/created", event_type="product.created"),
+        Webhook(url="http://hooks.test/updated", event_type="product.updated"),
+        Webhook(url="http://hooks.test/disabled", event_type="product.created", enabled=False),
+        Product(sku="WH-1", name="Product 1"),
+        Product(sku="WH-2", name="Product 2"),
+    ])
+    db.commit()
+    return [p.id for p in db.query(Product).order_by(Product.id)]
+
+def _mock_delivery(mocker):
+    return mocker.patch(
+        "app.tasks.deliver_webhooks",
+        side_effect=lambda deliveries: ([True] * len(deliveries), {}),
+    )
+
+def test_relay_envelope_mode(db, mock_redis, mocker):
+    """Envelope mode sends one body per webhook and run of same-type events"""
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.WEBHOOK_DELIVERY_MODE", "envelope")
+    mock_deliver = _mock_delivery(mocker)
+    
+    _setup(db)
+    add_outbox_events(db, [
+        ("product.created", {"id": 1, "sku": "A"}),
+        ("product.created", {"id": 2, "sku": "B"}),
+        ("product.updated", {"id": 1, "sku": "A"}),
+    ])
+    db.commit()
+    
+    assert relay_outbox_events.apply().result["relayed"] == 3
+    
+    bodies = [d[2] for d in mock_deliver.call_args.args[0]]
+    assert [(b["event"], [p["sku"] for p in b["products"]]) for b in bodies] == [
+        ("product.created", ["A", "B"]), ("product.updated", ["A"]),
+    ]
+
+def test_bulk_delete_task_emits_batched_events(db, mocker):
+    """With product.deleted subscribers, rows are deleted in chunks and each chunk's payloads go to the outbox"""
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.BULK_DELETE_CHUNK_SIZE", 2)
+    mock_publish = mocker.patch("app.tasks.publish_progress")
+    mock_schedule = mocker.patch("app.tasks.schedule_outbox_relay")
+    
+    db.add(Webhook(url="http://hooks.test/deleted", event_type="product.deleted"))
+    db.add_all([Product(sku=f"DEL-{i}", name=f"Product {i}") for i in range(3)])
+    db.commit()
+    
+    result = bulk_delete_products_task.apply().result
+    
+    assert result == {"status": "success", "count": 3}
+    assert db.query(Product).count() == 0
+    assert mock_schedule.call_count == 2
+    events = db.query(OutboxEvent).order_by(OutboxEvent.id).all()
+    assert [e.event_type for e in events] == ["product.deleted"] * 3
+    assert [e.payload["sku"] for e in events] == ["DEL-0", "DEL-1", "DEL-2"]
+    assert mock_publish.call_args_list[-1].args[1] == "completed"
+
+def test_bulk_delete_task_without_subscribers(db, mocker):
+    """Without product.deleted subscribers the table is cleared in one statement and no events are sent"""
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.publish_progress")
+    
+    db.add_all([Product(sku=f"DEL-{i}", name=f"Product {i}") for i in range(3)])
+    db.commit()
+    
+    result = bulk_delete_products_task.apply().result
+    
+    assert result == {"status": "success", "count": 3}
+    assert db.query(Product).count() == 0
+    assert db.query(OutboxEvent).count() == 0
+
+def test_outbox_skips_unsubscribed_events(db):
+    """Only event types with an enabled subscriber are written to the outbox"""
+    _setup(db)
+    
+    written = add_outbox_events(db, [
+        ("product.created", {"id": 1, "sku": "A"}),
+        ("product.deleted", {"id": 2, "sku": "B"}),
+    ])
+    db.commit()
+    
+    assert written == 1
+    assert [e.event_type for e in db.query(OutboxEvent)] == ["product.created"]
+
+def test_relay_drains_outbox_in_order(db, mock_redis, mocker):
+    """The relay delivers outbox events oldest first in one batch and removes them"""
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.OUTBOX_BATCH_SIZE", 2)
+    mock_deliver = _mock_delivery(mocker)
+    
+    _setup(db)
+    add_outbox_events(db, [
+        ("product.created", {"id": 1, "sku": "A"}),
+        ("product.updated", {"id": 1, "sku": "A"}),
+        ("product.created", {"id": 2, "sku": "B"}),
+    ])
+    db.commit()
+    
+    result = relay_outbox_events.apply().result
+    
+    assert result["relayed"] == 3
+    assert set(result["stages"]) == {"load_events", "load_subscriptions", "deliver", "record_stats", "update_outbox"}
+    assert mock_deliver.call_count == 2
+    bodies = [d[2] for call in mock_deliver.call_args_list for d in call.args[0]]
+    assert [(b["event"], b["product"]["sku"]) for b in bodies] == [
+        ("product.created", "A"), ("product.updated", "A"), ("product.created", "B"),
+    ]
+    assert db.query(OutboxEvent).count() == 0
+    mock_redis.delete.assert_any_call("outbox:relay_pending")
+
+def test_relay_keeps_failed_events_for_the_failed_webhook(db, mock_redis, mocker):
+    """A failed event stays owed to the webhook that failed and holds back that webhook's later events"""
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.OUTBOX_BATCH_SIZE", 1)
+    _setup(db)
+    db.add(Webhook(url="http://hooks.test/created-2", event_type="product.created"))
+    db.commit()
+    add_outbox_events(db, [
+        ("product.created", {"id": 1, "sku": "A"}),
+        ("product.created", {"id": 2, "sku": "B"}),
+    ])
+    db.commit()
+    
+    down = "http://hooks.test/created"
+    mock_deliver = mocker.patch(
+        "app.tasks.deliver_webhooks",
+        side_effect=lambda deliveries: ([d[1] != down for d in deliveries], {}),
+    )
+    assert relay_outbox_events.apply().result["relayed"] == 0
+    
+    sent = [(d[1], d[2]["product"]["sku"]) for call in mock_deliver.call_args_list for d in call.args[0]]
+    assert sent == [(down, "A"), ("http://hooks.test/created-2", "A"), ("http://hooks.test/created-2", "B")]
+    down_id = db.query(Webhook.id).filter(Webhook.url == down).scalar()
+    events = db.query(OutboxEvent).order_by(OutboxEvent.id).all()
+    assert [(e.payload["sku"], e.webhook_ids, e.attempts) for e in events] == [("A", [down_id], 1), ("B", [down_id], 0)]
+    
+    mock_deliver.side_effect = lambda deliveries: ([True] * len(deliveries), {})
+    mock_deliver.reset_mock()
+    assert relay_outbox_events.apply().result["relayed"] == 2
+    
+    sent = [(d[1], d[2]["product"]["sku"]) for call in mock_deliver.call_args_list for d in call.args[0]]
+    assert sent == [(down, "A"), (down, "B")]
+    assert db.query(OutboxEvent).count() == 0
+
+def test_relay_leaves_dead_letters(db, mock_redis, mocker):
+    """Events that failed OUTBOX_MAX_ATTEMPTS times stay in the table but are no longer sent"""
+    mocker.patch("app.tasks.SessionLocal", return_value=db)
+    mocker.patch("app.tasks.OUTBOX_MAX_ATTEMPTS", 2)
+    mock_deliver = mocker.patch(
+        "app.tasks.deliver_webhooks",
+        side_effect=lambda deliveries: ([False] * len(deliveries), {}),
+    )
+    _setup(db)
+    add_outbox_events(db, [("product.created", {"id": 1, "sku": "A"})])
+    db.commit()
+    
+    for _ in range(3):
+        relay_outbox_events.apply()
+    
+    assert mock_deliver.call_count == 2
+    assert db.query(OutboxEvent.attempts).scalar() == 2
+
+def test_migrate_columns_adds_missing_columns(db):
+    """Columns added to a model after its table was created are added in place"""
+    db.execute(text("ALTER TABLE outbox_events DROP COLUMN attempts"))
+    db.commit()
+    
+    migrate_columns(bind=db.get_bind())
+    
+    assert "attempts" in {column["name"] for column in inspect(db.get_bind()).get_columns("outbox_events")}
+
+def test_product_api_writes_outbox_events(client, db, mocker):
+    """Create, update and delete commit their event with the change; delete keeps the row's payload"""
+    mock_schedule = mocker.patch("app.main.schedule_outbox_relay")
+    for event_type in ("product.created", "product.updated", "product.deleted"):
+        db.add(Webhook(url=f"http://hooks.test/{event_type}", event_type=event_type))
+    db.commit()
+    
+    product_id = client.post("/api/products", json={"sku": "OB-1", "name": "Outbox"}).json()["id"]
+    client.put(f"/api/products/{product_id}", json={"name": "Outbox 2"})
+    client.delete(f"/api/products/{product_id}")
+    
+    events = db.query(OutboxEvent).order_by(OutboxEvent.id).all()
+    assert [(e.event_type, e.payload["name"]) for e in events] == [
+        ("product.created", "Outbox"), ("product.updated", "Outbox 2"), ("product.deleted", "Outbox 2"),
+    ]
+    assert all(e.product_id == product_id for e in events)
+    assert mock_schedule.call_count == 3